@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Attribution daemon: signs the known corpus once, keeps the signatures in
+memory and answers match requests over HTTP on TCP or a Unix socket.
+
+    python attribution_server.py KNOWN_DIR [--port 8765 | --unix PATH] [--jobs N]
+                                           [--watch SECONDS]
+
+    curl --data-binary @mystery.txt 'http://127.0.0.1:8765/match?top=3'
+    curl 'http://127.0.0.1:8765/health'
+
+POST /match takes the mystery text (UTF-8) as the request body; the query
+string may set `top` (default 1) and `weights` (five comma-separated
+numbers). Signing runs in a process pool so the event loop never blocks
+on CPU work, and any number of requests are served concurrently. With
+--watch the corpus is re-checked periodically and only added, modified
+or deleted books are re-signed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import improved_authorship_identification as aid
+
+# Largest request body accepted, in bytes.
+MAX_BODY = 64 << 20
+
+_REASONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    411: 'Length Required', 413: 'Payload Too Large', 417: 'Expectation Failed',
+    500: 'Internal Server Error',
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def _sign_bytes(data: bytes) -> List[float]:
+    """Pool worker: signature of a UTF-8 request body."""
+    return aid.make_signature(data.decode('utf-8'))
+
+
+class AttributionServer:
+    """
+    Holds the corpus index (searched as a SignatureMatrix when NumPy is
+    present) and serves /match and /health. Mystery texts are signed in
+    `pool`; scoring and index refreshes run on the default thread executor.
+    """
+
+    def __init__(
+        self,
+        index: aid.CorpusIndex,
+        weights: List[float],
+        jobs: int = 1
+    ) -> None:
+        self.index = index
+        self.weights = weights
+        self.pool = ProcessPoolExecutor(max_workers=max(1, jobs))
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        sigs = self.index.signatures
+        self.known = aid.SignatureMatrix.from_dict(sigs) if aid.load_numpy() is not None else dict(sigs)
+
+    def close(self) -> None:
+        self.pool.shutdown(cancel_futures=True)
+
+    async def watch(self, interval: float) -> None:
+        """
+        Refresh the corpus index every `interval` seconds. A failed refresh
+        is reported on stderr and the watcher keeps polling; files it did
+        not get to are still stale, so the next refresh retries them.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                added, modified, removed = await loop.run_in_executor(None, self.index.refresh)
+            except Exception as e:
+                print(f"Index refresh failed: {e}", file=sys.stderr, flush=True)
+                # it may have got part of the way
+                self._rebuild()
+                continue
+            if added or modified or removed:
+                self._rebuild()
+                print(f"Index updated: {len(added)} added, {len(modified)} modified, "
+                      f"{len(removed)} removed", flush=True)
+
+    async def match(self, body: bytes, query: Dict[str, List[str]]) -> Dict[str, object]:
+        top = _int_param(query, 'top', 1)
+        weights = _weights_param(query, self.weights)
+        loop = asyncio.get_running_loop()
+        try:
+            sig = await loop.run_in_executor(self.pool, _sign_bytes, body)
+        except UnicodeDecodeError as e:
+            raise HTTPError(400, f"body is not valid UTF-8: {e}")
+        matches = await loop.run_in_executor(
+            None, aid.find_top_matches, sig, self.known, weights, top
+        )
+        return {
+            'signature': sig,
+            'matches': [{'key': key, 'score': score} for key, score in matches],
+        }
+
+    async def route(self, method: str, target: str, body: bytes) -> Dict[str, object]:
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        if url.path == '/health':
+            return {'status': 'ok', 'signatures': len(self.known)}
+        if url.path == '/match':
+            if method != 'POST':
+                raise HTTPError(405, "use POST with the mystery text as the body")
+            return await self.match(body, query)
+        raise HTTPError(404, f"no such endpoint: {url.path}")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve requests on one connection until the client closes it."""
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader, writer)
+                except HTTPError as e:
+                    await _respond(writer, e.status, {'error': str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                try:
+                    status, payload = 200, await self.route(method, target, body)
+                except HTTPError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except Exception as e:
+                    status, payload = 500, {'error': str(e)}
+                await _respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def _int_param(query: Dict[str, List[str]], name: str, default: int) -> int:
+    if name not in query:
+        return default
+    try:
+        return int(query[name][0])
+    except ValueError:
+        raise HTTPError(400, f"{name} must be an integer")
+
+
+def _weights_param(query: Dict[str, List[str]], default: List[float]) -> List[float]:
+    if 'weights' not in query:
+        return default
+    try:
+        weights = [float(w) for w in query['weights'][0].split(',')]
+    except ValueError:
+        raise HTTPError(400, "weights must be comma-separated numbers")
+    if len(weights) != len(default):
+        raise HTTPError(400, f"expected {len(default)} weights")
+    return weights
+
+
+async def _read_request(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter
+) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    """
+    Parse one HTTP/1.1 request; None once the client has closed the connection.
+    An `Expect: 100-continue` is answered before the body is read, since
+    curl waits for it before sending large uploads.
+    """
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, _ = line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'transfer-encoding' in headers:
+        raise HTTPError(411, "chunked bodies are not supported; send Content-Length")
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HTTPError(400, "bad Content-Length")
+    if length > MAX_BODY:
+        raise HTTPError(413, f"body larger than {MAX_BODY} bytes")
+    expect = headers.get('expect', '').lower()
+    if expect == '100-continue':
+        writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+        await writer.drain()
+    elif expect:
+        raise HTTPError(417, f"unsupported expectation: {expect}")
+    body = await reader.readexactly(length) if length else b''
+    return method, target, headers, body
+
+
+async def _respond(
+    writer: asyncio.StreamWriter,
+    status: int,
+    payload: Dict[str, object],
+    keep_alive: bool
+) -> None:
+    body = json.dumps(payload).encode('utf-8')
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode('latin-1') + body)
+    await writer.drain()
+
+
+async def serve(
+    server: AttributionServer,
+    host: str = '127.0.0.1',
+    port: int = 8765,
+    unix_path: Optional[str] = None,
+    watch: Optional[float] = None
+) -> None:
+    """
+    Run `server` until cancelled, on `unix_path` if given, else host:port,
+    refreshing its index every `watch` seconds if given.
+    """
+    if unix_path is not None:
+        listener = await asyncio.start_unix_server(server.handle, path=unix_path)
+        where = unix_path
+    else:
+        listener = await asyncio.start_server(server.handle, host, port)
+        where = f"http://{host}:{port}"
+    print(f"Serving {len(server.known)} signatures on {where}", flush=True)
+    watcher = asyncio.create_task(server.watch(watch)) if watch else None
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+
+
+# ─── CLI Entrypoint
+
+def main():
+    p = argparse.ArgumentParser(description="Attribution server with a warm signature index")
+    p.add_argument('known_dir', help="Directory of known-author .txt files")
+    p.add_argument('--host', default='127.0.0.1', help="Address to listen on")
+    p.add_argument('--port', type=int, default=8765, help="TCP port to listen on")
+    p.add_argument('--unix', metavar='PATH', help="Listen on a Unix socket instead of TCP")
+    p.add_argument(
+        '--weights',
+        nargs=5,
+        type=float,
+        default=[1, 1, 1, 1, 1],
+        help="Default weights for the signature dimensions"
+    )
+    p.add_argument(
+        '--cache',
+        metavar='PATH',
+        help=f"Signature cache file (default: KNOWN_DIR/{aid.CACHE_FILENAME})"
+    )
+    p.add_argument('--no-cache', action='store_true', help="Do not use the signature cache")
+    p.add_argument(
+        '--jobs',
+        metavar='N',
+        type=int,
+        default=0,
+        help="Signing processes for the corpus and requests (0 = one per CPU)"
+    )
+    p.add_argument(
+        '--watch',
+        metavar='SECONDS',
+        type=float,
+        help="Re-check known_dir this often and re-sign only changed books"
+    )
+    args = p.parse_args()
+    cache_path = None
+    if not args.no_cache:
+        cache_path = args.cache or os.path.join(args.known_dir, aid.CACHE_FILENAME)
+    jobs = args.jobs or os.cpu_count() or 1
+
+    index = aid.CorpusIndex(args.known_dir, cache_path, jobs)
+    index.refresh()
+    server = AttributionServer(index, args.weights, jobs)
+    try:
+        asyncio.run(serve(server, args.host, args.port, args.unix, args.watch))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,664 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the text-signature pipeline.
+
+    python benchmarks.py tokenizer [--size-mb N]
+    python benchmarks.py clean-word [--min-speedup X]
+    python benchmarks.py signature [--vocab N ...] [--words W] [--min-speedup X]
+    python benchmarks.py nn-index [--sigs N] [--queries Q] [--top K]
+    python benchmarks.py pruned [--sigs N] [--queries Q] [--top K]
+    python benchmarks.py startup [--docs N] [--runs R]
+    python benchmarks.py sketch [--vocab N ...] [--words W] [--max-error E]
+    python benchmarks.py suite [--docs N] [--doc-kb K] [--out results.json]
+                               [--compare baseline.json]
+
+`suite` times each stage of the pipeline on a generated corpus and writes
+the numbers as JSON, so runs on different commits can be compared.
+
+Everything runs offline on synthetic text generated from a fixed seed.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import improved_authorship_identification as aid
+
+# ─── Synthetic Text
+
+_WORDS = (
+    "the a of and to in was he she it that his her with as for had you not "
+    "be on at by which have or from this but they were one all we there been "
+    "if so when would who what more pearl lustrous card-board don't naive "
+    "U.S.A. e.g. Mr. 3.14 ...word (paren) \"quoted\""
+).split()
+# Weighted so sentences run to roughly 15 words, as in ordinary prose.
+_PUNCT = [''] * 40 + [','] * 3 + ['.'] * 2 + ['!', '?', ';', ':', '...', ',"', '--']
+_SPACES = [' '] * 12 + ['\n', '\n\n', '\t', '  ']
+
+
+def synthetic_text(n_bytes: int, seed: int = 0) -> str:
+    """Deterministic prose-like text of roughly `n_bytes` characters."""
+    rng = random.Random(seed)
+    parts: List[str] = []
+    size = 0
+    while size < n_bytes:
+        piece = rng.choice(_WORDS) + rng.choice(_PUNCT) + rng.choice(_SPACES)
+        parts.append(piece)
+        size += len(piece)
+    return ''.join(parts)
+
+
+def write_corpus(directory: str, n_docs: int, doc_bytes: int, seed: int = 0) -> None:
+    """Fill `directory` with `n_docs` synthetic .txt books of about `doc_bytes` each."""
+    os.makedirs(directory, exist_ok=True)
+    width = len(str(n_docs))
+    for i in range(n_docs):
+        path = os.path.join(directory, f"book{i:0{width}d}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(synthetic_text(doc_bytes, seed + i))
+
+
+def zipf_text(n_words: int, vocab: int, seed: int = 0) -> str:
+    """
+    `n_words` words drawn with Zipf's law from `vocab` random lowercase
+    words, ending sentences every 20 words, so the vocabulary (and hapax
+    count) can be made as large as a multilingual dump's.
+    """
+    rng = random.Random(seed)
+    words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 12)))
+             for _ in range(vocab)]
+    drawn = rng.choices(words, cum_weights=list(_cumulative_zipf(vocab)), k=n_words)
+    for i in range(19, n_words, 20):
+        drawn[i] += '.'
+    return ' '.join(drawn)
+
+
+def zipf_prose(n_words: int, vocab: int, seed: int = 0) -> str:
+    """
+    zipf_text's words with synthetic_text's punctuation and spacing, so the
+    vocabulary is realistic in size and the punctuation is ordinary prose.
+    """
+    rng = random.Random(seed)
+    words = zipf_text(n_words, vocab, seed).replace('.', '').split()
+    return ''.join(w + rng.choice(_PUNCT) + rng.choice(_SPACES) for w in words)
+
+
+def _cumulative_zipf(n: int, s: float = 1.05):
+    total = 0.0
+    for rank in range(1, n + 1):
+        total += rank ** -s
+        yield total
+
+
+def synthetic_signatures(n: int, seed: int = 0) -> Dict[str, List[float]]:
+    """`n` random signatures in the value ranges real books produce."""
+    rng = random.Random(seed)
+    return {
+        f"book{i}.txt": [
+            rng.uniform(3.5, 5.5), rng.uniform(0.05, 0.6), rng.uniform(0.02, 0.4),
+            rng.uniform(8, 30), rng.uniform(1, 4),
+        ]
+        for i in range(n)
+    }
+
+
+def best_time(fn: Callable[[], object], repeat: int = 3) -> float:
+    """Fastest of `repeat` wall-clock runs of `fn`, in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# ─── Reference Implementations
+
+def split_on_chars_loop(text: str, seps: str) -> List[str]:
+    """The original character-by-character split_on_chars, kept as a baseline."""
+    if not text:
+        return []
+    sep_set = set(seps)
+    parts: List[str] = []
+    buf: List[str] = []
+    for ch in text:
+        if ch in sep_set:
+            chunk = ''.join(buf).strip()
+            if chunk:
+                parts.append(chunk)
+            buf.clear()
+        else:
+            buf.append(ch)
+    chunk = ''.join(buf).strip()
+    if chunk:
+        parts.append(chunk)
+    return parts
+
+
+def clean_word_loop(word: str) -> str:
+    """The original slice-per-character clean_word, kept as a baseline."""
+    w = word.strip().lower()
+    while w and w[0] in string.punctuation:
+        w = w[1:]
+    while w and w[-1] in string.punctuation:
+        w = w[:-1]
+    return w
+
+
+def _cleaned_words_loop(text: str) -> List[str]:
+    return [w for w in map(clean_word_loop, text.split()) if w]
+
+
+def make_signature_loop(text: str) -> List[float]:
+    """
+    The original authorship_identifier.make_signature, kept as a baseline:
+    five feature functions, each splitting and cleaning the text again.
+    """
+    words = _cleaned_words_loop(text)
+    word_len = sum(map(len, words)) / len(words) if words else 0
+    words = _cleaned_words_loop(text)
+    ttr = len(set(words)) / len(words) if words else 0
+    words = _cleaned_words_loop(text)
+    counts: Dict[str, int] = {}
+    for w in words:
+        counts[w] = counts.get(w, 0) + 1
+    hapax = sum(1 for n in counts.values() if n == 1) / len(words) if words else 0
+    n_words = n_sentences = 0
+    for sentence in split_on_chars_loop(text, '.?!'):
+        parts = split_on_chars_loop(sentence, ' ')
+        n_words += len(parts)
+        n_sentences += 1 if parts else 0
+    sent_len = n_words / n_sentences if n_sentences else 0
+    n_phrases = n_sentences = 0
+    for sentence in split_on_chars_loop(text, '.?!'):
+        parts = split_on_chars_loop(sentence, ',;:')
+        n_phrases += len(parts)
+        n_sentences += 1 if parts else 0
+    complexity = n_phrases / n_sentences if n_sentences else 0
+    return [word_len, ttr, hapax, sent_len, complexity]
+
+
+def make_signature_five_pass(text: str) -> List[float]:
+    """
+    The original improved_authorship_identification.make_signature, kept
+    as a baseline: five feature functions, each splitting and cleaning
+    the text again.
+    """
+    words = _cleaned_words_loop(text)
+    word_len = sum(map(len, words)) / len(words) if words else 0.0
+    words = [clean_word_loop(w) for w in text.split() if clean_word_loop(w)]
+    ttr = len(set(words)) / len(words) if words else 0.0
+    words = [clean_word_loop(w) for w in text.split() if clean_word_loop(w)]
+    counts: Dict[str, int] = {}
+    for w in words:
+        counts[w] = counts.get(w, 0) + 1
+    hapax = sum(1 for n in counts.values() if n == 1) / len(words) if words else 0.0
+    sentences = split_on_chars_loop(text, '.?!')
+    sent_len = sum(len(s.split()) for s in sentences) / len(sentences) if sentences else 0.0
+    sentences = split_on_chars_loop(text, '.?!')
+    complexity = (sum(len(split_on_chars_loop(s, ',;:')) for s in sentences) / len(sentences)
+                  if sentences else 0.0)
+    return [word_len, ttr, hapax, sent_len, complexity]
+
+
+def find_best_match_loop(mystery_sig: List[float], known_sigs: Dict[str, List[float]],
+                         weights: List[float]) -> Optional[str]:
+    """find_best_match scoring every dimension of every signature, kept as a baseline."""
+    best_key, best_score = None, float('inf')
+    for key, sig in known_sigs.items():
+        sc = aid.score_signature(sig, mystery_sig, weights)
+        if sc < best_score:
+            best_score, best_key = sc, key
+    return best_key
+
+
+# ─── Benchmarks
+
+def bench_tokenizer(size_mb: float, repeat: int) -> None:
+    text = synthetic_text(int(size_mb * 1_000_000))
+    sentences = aid.get_sentences(text)
+    assert sentences == split_on_chars_loop(text, '.?!')
+    cases = [
+        ('sentences', lambda: aid.split_on_chars(text, '.?!'),
+         lambda: split_on_chars_loop(text, '.?!')),
+        ('phrases/sentence', lambda: [aid.split_on_chars(s, ',;:') for s in sentences],
+         lambda: [split_on_chars_loop(s, ',;:') for s in sentences]),
+    ]
+    print(f"tokenizer on {len(text) / 1e6:.1f} MB of text")
+    for name, fast, slow in cases:
+        t_fast = best_time(fast, repeat)
+        t_slow = best_time(slow, repeat)
+        print(f"  {name:<18} loop {t_slow:8.3f}s  regex {t_fast:8.3f}s  x{t_slow / t_fast:.1f}")
+
+
+def bench_clean_word(n_tokens: int, repeat: int, min_speedup: float) -> bool:
+    """
+    Time clean_word / clean_words against the slicing loop, on ordinary
+    tokens and on heavily punctuated ones where the loop goes quadratic.
+    Returns False if either path is slower than `min_speedup` x the loop.
+    """
+    rng = random.Random(0)
+    plain = synthetic_text(n_tokens * 6).split()[:n_tokens]
+    heavy = [
+        rng.choice('.!?"\'(') * rng.randint(5, 60) + rng.choice(_WORDS)
+        + rng.choice('.!?,")') * rng.randint(5, 60)
+        for _ in range(n_tokens // 10)
+    ]
+    ok = True
+    print(f"clean_word on {len(plain)} plain / {len(heavy)} punctuation-heavy tokens")
+    for name, tokens in (('plain', plain), ('punctuated', heavy)):
+        assert aid.clean_words(tokens) == [clean_word_loop(t) for t in tokens]
+        t_loop = best_time(lambda: [clean_word_loop(t) for t in tokens], repeat)
+        t_one = best_time(lambda: [aid.clean_word(t) for t in tokens], repeat)
+        t_bulk = best_time(lambda: aid.clean_words(tokens), repeat)
+        print(f"  {name:<11} loop {t_loop:7.3f}s  clean_word {t_one:7.3f}s "
+              f"(x{t_loop / t_one:.1f})  clean_words {t_bulk:7.3f}s (x{t_loop / t_bulk:.1f})")
+        if min(t_loop / t_one, t_loop / t_bulk) < min_speedup:
+            ok = False
+    if not ok:
+        print(f"REGRESSION: speedup below x{min_speedup}")
+    return ok
+
+
+def bench_signature(vocab_sizes: List[int], n_words: int, repeat: int, min_speedup: float) -> bool:
+    """
+    Time both modules' make_signature against their original five-pass
+    versions on Zipf prose over each vocabulary size, plain and with a
+    non-ASCII word (which changes the string's internal width).
+    Returns False on a mismatch or a speedup below `min_speedup`.
+    """
+    import authorship_identifier
+    cases = (
+        ('authorship_identifier', authorship_identifier.make_signature, make_signature_loop),
+        ('improved', aid.make_signature, make_signature_five_pass),
+    )
+    print(f"signature: {n_words} words per text")
+    ok = True
+    for vocab in vocab_sizes:
+        prose = zipf_prose(n_words, vocab, seed=vocab)
+        for label, text in (('ascii', prose), ('unicode', prose + ' caf\u00e9 \u6771\u4eac.')):
+            distinct = len(set(text.split()))
+            for module, fast, slow in cases:
+                if fast(text) != slow(text):
+                    print(f"  {module} vocab {vocab} {label}: MISMATCH against the original")
+                    ok = False
+                    continue
+                t_loop = best_time(lambda: slow(text), repeat)
+                t_new = best_time(lambda: fast(text), repeat)
+                print(f"  {module:<21} vocab {vocab:>7} {label:<8} distinct {distinct:>7}  "
+                      f"original {t_loop:7.3f}s  make_signature {t_new:7.3f}s  "
+                      f"x{t_loop / t_new:.1f}")
+                if t_loop / t_new < min_speedup:
+                    ok = False
+    if not ok:
+        print(f"REGRESSION: mismatch or speedup below x{min_speedup}")
+    return ok
+
+
+def bench_nn_index(n_sigs: int, n_queries: int, k: int, leaf_size: int, repeat: int) -> bool:
+    """
+    Time SignatureTree queries against the SignatureMatrix linear scan on
+    `n_sigs` signatures, with uniform and skewed weights, and with a tree
+    shaped for other weights than the queries use. Returns False if any
+    answer differs from the scan.
+    """
+    if aid.load_numpy() is None:
+        print("nn-index needs NumPy")
+        return False
+    sigs = synthetic_signatures(n_sigs)
+    queries = list(synthetic_signatures(n_queries, seed=1).values())
+    matrix = aid.SignatureMatrix.from_dict(sigs)
+    uniform = [1, 1, 1, 1, 1]
+    skewed = [10, 0.1, 5, 0.01, 1]
+    print(f"nn-index on {n_sigs} signatures")
+    ok = True
+    for name, shape, weights in (('uniform', uniform, uniform),
+                                 ('skewed', skewed, skewed),
+                                 ('mismatch', uniform, skewed)):
+        start = time.perf_counter()
+        tree = aid.SignatureTree(matrix, leaf_size, shape)
+        t_build = time.perf_counter() - start
+        scan = [matrix.top_k(q, weights, k) for q in queries]
+        if [tree.top_k(q, weights, k) for q in queries] != scan:
+            print(f"  {name}: MISMATCH against the linear scan")
+            ok = False
+            continue
+        t_scan = best_time(lambda: [matrix.top_k(q, weights, k) for q in queries], repeat)
+        t_tree = best_time(lambda: [tree.top_k(q, weights, k) for q in queries], repeat)
+        per = 1e3 / len(queries)
+        print(f"  {name:<8} top-{k}  build {t_build:6.2f}s  scan {t_scan * per:8.3f} ms/query  "
+              f"tree {t_tree * per:8.3f} ms/query  x{t_scan / t_tree:.1f}")
+    return ok
+
+
+def bench_pruned(n_sigs: int, n_queries: int, k: int, repeat: int) -> bool:
+    """
+    Pure-Python search over `n_sigs` signatures: the full scoring loop,
+    find_best_match's early-abandon scan of the dict, and a
+    SortedSignatureIndex, with uniform and skewed weights. Returns False
+    if any answer differs from the full loop.
+    """
+    sigs = synthetic_signatures(n_sigs)
+    queries = list(synthetic_signatures(n_queries, seed=1).values())
+    start = time.perf_counter()
+    index = aid.SortedSignatureIndex(sigs)
+    t_build = time.perf_counter() - start
+    print(f"pruned on {n_sigs} signatures, {n_queries} queries (index built in {t_build:.2f}s)")
+    ok = True
+    for name, weights in (('uniform', [1, 1, 1, 1, 1]), ('skewed', [10, 0.1, 5, 0.01, 1])):
+        expected = [find_best_match_loop(q, sigs, weights) for q in queries]
+        expected_top = [aid.find_top_matches(q, sigs, weights, k) for q in queries]
+        if [aid.find_best_match(q, sigs, weights) for q in queries] != expected \
+                or [index.best(q, weights) for q in queries] != expected \
+                or [index.top_k(q, weights, k) for q in queries] != expected_top:
+            print(f"  {name}: MISMATCH against the full loop")
+            ok = False
+            continue
+        t_loop = best_time(lambda: [find_best_match_loop(q, sigs, weights) for q in queries], repeat)
+        t_abandon = best_time(lambda: [aid.find_best_match(q, sigs, weights) for q in queries], repeat)
+        t_index = best_time(lambda: [index.best(q, weights) for q in queries], repeat)
+        t_top = best_time(lambda: [index.top_k(q, weights, k) for q in queries], repeat)
+        t_heap = best_time(lambda: [aid.find_top_matches(q, sigs, weights, k) for q in queries], repeat)
+        per = 1e3 / len(queries)
+        print(f"  {name:<8} best: loop {t_loop * per:8.3f}  early-abandon {t_abandon * per:8.3f}  "
+              f"index {t_index * per:8.3f} ms/query  (x{t_loop / t_abandon:.1f}, "
+              f"x{t_loop / t_index:.1f})")
+        print(f"  {'':<8} top-{k}: heap {t_heap * per:8.3f}  index {t_top * per:8.3f} ms/query  "
+              f"(x{t_heap / t_top:.1f})")
+    return ok
+
+
+def bench_startup(n_docs: int, doc_bytes: int, runs: int) -> Dict[str, float]:
+    """
+    Time to first result of the CLI, as a fresh process per run, for one
+    small mystery against `n_docs` known books: bare interpreter and module
+    import for reference, then no cache, the signature cache, and a
+    precomputed --index store. Returns the median milliseconds per mode.
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'improved_authorship_identification.py')
+    medians: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = os.path.join(tmp, 'corpus')
+        write_corpus(corpus, n_docs, doc_bytes)
+        mystery = os.path.join(tmp, 'mystery.txt')
+        with open(mystery, 'w', encoding='utf-8') as f:
+            f.write(synthetic_text(2000, seed=n_docs))
+        cli = [sys.executable, script, corpus, mystery]
+        modes = [
+            ('python', [sys.executable, '-c', 'pass']),
+            ('import', [sys.executable, '-c', 'import improved_authorship_identification']),
+            ('no-cache', cli + ['--no-cache']),
+            ('cache', cli),
+            ('index', cli + ['--index', os.path.join(tmp, 'known.sig')]),
+        ]
+        print(f"startup: {n_docs} known books x {doc_bytes / 1e3:.0f} KB, {runs} runs")
+        for name, cmd in modes:
+            # one untimed run fills the cache / writes the index
+            subprocess.run(cmd, check=True, capture_output=True, cwd=os.path.dirname(script))
+            times = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                subprocess.run(cmd, check=True, capture_output=True, cwd=os.path.dirname(script))
+                times.append((time.perf_counter() - start) * 1e3)
+            medians[name] = statistics.median(times)
+            print(f"  {name:<10} median {medians[name]:8.1f} ms   min {min(times):8.1f} ms")
+    return medians
+
+
+def bench_sketch(vocab_sizes: List[int], n_words: int, max_error: float) -> bool:
+    """
+    Sign Zipf texts of `n_words` words over each vocabulary size exactly
+    and with sketches (default features plus hashed character n-grams):
+    relative error of the two estimated ratios, peak traced memory and
+    time of each path. Returns False if an estimate is off by more than
+    `max_error` (relative).
+    """
+    names = aid.DEFAULT_FEATURES + ('char_ngrams',)
+    paths = (('exact', aid.FeatureSet(names)), ('sketch', aid.FeatureSet(names, sketch=True)))
+    print(f"sketch: {n_words} words per text")
+    ok = True
+    for vocab in vocab_sizes:
+        text = zipf_text(n_words, vocab, seed=vocab)
+        results = {}
+        for name, features in paths:
+            def sign():
+                acc = features.accumulator()
+                for start in range(0, len(text), aid.CHUNK_SIZE):
+                    acc.update(text[start:start + aid.CHUNK_SIZE])
+                return features.vector(acc)
+            elapsed = best_time(sign, 1)
+            tracemalloc.start()
+            sig = sign()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[name] = (sig, peak, elapsed)
+        exact, sketch = results['exact'][0], results['sketch'][0]
+        errors = [abs(s - e) / e if e else abs(s) for s, e in zip(sketch[1:3], exact[1:3])]
+        exact_part = [0] + list(range(3, len(exact)))
+        drift = max(abs(sketch[i] - exact[i]) for i in exact_part)
+        print(f"  vocab {vocab:>9}  distinct {exact[1] * n_words:>9.0f}  "
+              f"ttr err {errors[0]:6.2%}  hapax err {errors[1]:6.2%}  other drift {drift:.1e}")
+        for name, (_, peak, elapsed) in results.items():
+            print(f"    {name:<7} peak {peak / 1e6:8.1f} MB  {elapsed:6.2f}s")
+        if max(errors) > max_error or drift:
+            print(f"  FAILED: error above {max_error:.0%}" if max(errors) > max_error
+                  else "  FAILED: exact features differ")
+            ok = False
+    return ok
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_suite(
+    n_docs: int,
+    doc_bytes: int,
+    text_bytes: int,
+    n_sigs: int,
+    jobs: int,
+    repeat: int,
+    corpus_dir: Optional[str] = None
+) -> Dict[str, object]:
+    """
+    Time every pipeline stage separately and return a JSON-ready report:
+    make_signature and each feature function on one text of `text_bytes`,
+    get_all_signatures over `n_docs` files of `doc_bytes`, and
+    find_best_match against `n_sigs` signatures.
+    """
+    timings: Dict[str, float] = {}
+    text = synthetic_text(text_bytes)
+
+    def record(name: str, fn: Callable[[], object], runs: int = repeat) -> None:
+        timings[name] = best_time(fn, runs)
+        print(f"  {name:<40} {timings[name]:10.4f}s", flush=True)
+
+    print(f"text: {len(text) / 1e6:.2f} MB")
+    record('make_signature', lambda: aid.make_signature(text))
+    for fn in (aid.average_word_length, aid.type_token_ratio, aid.hapax_legomena_ratio,
+               aid.average_sentence_length, aid.average_sentence_complexity):
+        record(f"feature.{fn.__name__}", lambda fn=fn: fn(text))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = corpus_dir or os.path.join(tmp, 'corpus')
+        if not os.path.isdir(directory) or not os.listdir(directory):
+            write_corpus(directory, n_docs, doc_bytes)
+        print(f"corpus: {n_docs} docs x {doc_bytes / 1e3:.0f} KB")
+        record('get_all_signatures', lambda: aid.get_all_signatures(directory), 1)
+        if jobs > 1:
+            record(f"get_all_signatures.jobs{jobs}",
+                   lambda: aid.get_all_signatures(directory, jobs=jobs), 1)
+
+    sigs = synthetic_signatures(n_sigs)
+    query = synthetic_signatures(1, seed=1)['book0.txt']
+    weights = [1, 1, 1, 1, 1]
+    print(f"search: {n_sigs} signatures")
+    record('find_best_match', lambda: aid.find_best_match(query, sigs, weights))
+    index = aid.SortedSignatureIndex(sigs)
+    record('find_best_match.sorted', lambda: aid.find_best_match(query, index, weights))
+    if aid.load_numpy() is not None:
+        matrix = aid.SignatureMatrix.from_dict(sigs)
+        record('find_best_match.matrix', lambda: aid.find_best_match(query, matrix, weights))
+        tree = aid.SignatureTree(matrix)
+        record('find_best_match.tree', lambda: aid.find_best_match(query, tree, weights))
+
+    return {
+        'commit': _git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': {
+            'docs': n_docs, 'doc_bytes': doc_bytes, 'text_bytes': text_bytes,
+            'signatures': n_sigs, 'jobs': jobs, 'repeat': repeat,
+        },
+        'timings': timings,
+    }
+
+
+def compare_reports(baseline: Dict[str, object], current: Dict[str, object],
+                    max_slowdown: float) -> bool:
+    """Print per-stage ratios against `baseline`; False if any exceeds `max_slowdown`."""
+    if baseline.get('params') != current.get('params'):
+        print("warning: baseline was run with different parameters")
+    ok = True
+    print(f"vs {baseline.get('commit') or 'baseline'}:")
+    for name, now in current['timings'].items():
+        before = baseline['timings'].get(name)
+        if not before:
+            continue
+        ratio = now / before
+        flag = ''
+        if ratio > max_slowdown:
+            flag = '  REGRESSION'
+            ok = False
+        print(f"  {name:<40} x{ratio:6.2f}{flag}")
+    return ok
+
+
+# ─── CLI Entrypoint
+
+def main():
+    p = argparse.ArgumentParser(description="Signature pipeline benchmarks")
+    sub = p.add_subparsers(dest='bench', required=True)
+    tok = sub.add_parser('tokenizer', help="split_on_chars against the per-character loop")
+    tok.add_argument('--size-mb', type=float, default=5.0, help="Text size in MB")
+    tok.add_argument('--repeat', type=int, default=3, help="Runs per timing (best is kept)")
+    cw = sub.add_parser('clean-word', help="clean_word against the slicing loop")
+    cw.add_argument('--tokens', type=int, default=200_000, help="Plain tokens to clean")
+    cw.add_argument('--repeat', type=int, default=3, help="Runs per timing (best is kept)")
+    cw.add_argument(
+        '--min-speedup',
+        type=float,
+        default=1.2,
+        help="Exit non-zero if clean_word is not at least this much faster than the loop"
+    )
+    sg = sub.add_parser('signature', help="make_signature in both modules against the originals")
+    sg.add_argument('--vocab', type=int, nargs='+', default=[5_000, 100_000],
+                    help="Vocabulary sizes of the generated texts")
+    sg.add_argument('--words', type=int, default=300_000, help="Words per text")
+    sg.add_argument('--repeat', type=int, default=3, help="Runs per timing (best is kept)")
+    sg.add_argument(
+        '--min-speedup',
+        type=float,
+        default=5.0,
+        help="Exit non-zero if make_signature is not at least this much faster than the original"
+    )
+    nn = sub.add_parser('nn-index', help="SignatureTree against the linear scan")
+    nn.add_argument('--sigs', type=int, default=1_000_000, help="Signatures to index")
+    nn.add_argument('--queries', type=int, default=200, help="Queries per timing")
+    nn.add_argument('--top', type=int, default=1, help="Matches per query")
+    nn.add_argument('--leaf-size', type=int, default=aid.SignatureTree.LEAF_SIZE,
+                    help="Rows per tree leaf")
+    nn.add_argument('--repeat', type=int, default=3, help="Runs per timing (best is kept)")
+    pr = sub.add_parser('pruned', help="Early-abandon and sorted-index search against the full loop")
+    pr.add_argument('--sigs', type=int, default=100_000, help="Signatures to search")
+    pr.add_argument('--queries', type=int, default=50, help="Queries per timing")
+    pr.add_argument('--top', type=int, default=5, help="Matches per query for top-k")
+    pr.add_argument('--repeat', type=int, default=3, help="Runs per timing (best is kept)")
+    st = sub.add_parser('startup', help="CLI time to first result, per process")
+    st.add_argument('--docs', type=int, default=200, help="Known books in the generated corpus")
+    st.add_argument('--doc-kb', type=float, default=20, help="Size of each book in KB")
+    st.add_argument('--runs', type=int, default=10, help="Timed runs per mode")
+    sk = sub.add_parser('sketch', help="Sketched word statistics against the exact table")
+    sk.add_argument('--vocab', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                    help="Vocabulary sizes of the generated texts")
+    sk.add_argument('--words', type=int, default=2_000_000, help="Words per text")
+    sk.add_argument(
+        '--max-error',
+        type=float,
+        default=0.05,
+        help="Exit non-zero if a sketched ratio is off by more than this (relative)"
+    )
+    su = sub.add_parser('suite', help="Time every pipeline stage and save JSON")
+    su.add_argument('--docs', type=int, default=200, help="Books in the generated corpus")
+    su.add_argument('--doc-kb', type=float, default=20, help="Size of each book in KB")
+    su.add_argument('--text-mb', type=float, default=2, help="Text size for feature timings")
+    su.add_argument('--sigs', type=int, default=100_000, help="Signatures to search")
+    su.add_argument('--jobs', type=int, default=0, help="Also time a process pool of N (0 = skip)")
+    su.add_argument('--repeat', type=int, default=3, help="Runs per timing (best is kept)")
+    su.add_argument('--corpus-dir', help="Reuse or keep the generated corpus here")
+    su.add_argument('--out', help="Write the JSON report to this file")
+    su.add_argument('--compare', metavar='JSON', help="Earlier report to compare against")
+    su.add_argument(
+        '--max-slowdown',
+        type=float,
+        default=1.25,
+        help="With --compare, exit non-zero if a stage is this much slower"
+    )
+    args = p.parse_args()
+
+    if args.bench == 'suite':
+        report = run_suite(
+            args.docs, int(args.doc_kb * 1000), int(args.text_mb * 1_000_000),
+            args.sigs, args.jobs, args.repeat, args.corpus_dir,
+        )
+        if args.out:
+            with open(args.out, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        if args.compare:
+            with open(args.compare, encoding='utf-8') as f:
+                baseline = json.load(f)
+            if not compare_reports(baseline, report, args.max_slowdown):
+                sys.exit(1)
+    elif args.bench == 'tokenizer':
+        bench_tokenizer(args.size_mb, args.repeat)
+    elif args.bench == 'clean-word':
+        if not bench_clean_word(args.tokens, args.repeat, args.min_speedup):
+            sys.exit(1)
+    elif args.bench == 'signature':
+        if not bench_signature(args.vocab, args.words, args.repeat, args.min_speedup):
+            sys.exit(1)
+    elif args.bench == 'sketch':
+        if not bench_sketch(args.vocab, args.words, args.max_error):
+            sys.exit(1)
+    elif args.bench == 'startup':
+        bench_startup(args.docs, int(args.doc_kb * 1000), args.runs)
+    elif args.bench == 'pruned':
+        if not bench_pruned(args.sigs, args.queries, args.top, args.repeat):
+            sys.exit(1)
+    elif args.bench == 'nn-index':
+        if not bench_nn_index(args.sigs, args.queries, args.top, args.leaf_size, args.repeat):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
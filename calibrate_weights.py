@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Weight calibration: find signature weights that attribute a labelled
+corpus well, judged by leave-one-out nearest-neighbour accuracy.
+
+    python calibrate_weights.py KNOWN_DIR [--author-manifest FILE]
+                                [--search coordinate|random|grid]
+
+KNOWN_DIR holds one subdirectory of books per author, or flat .txt files
+labelled by --author-manifest (CSV filename,author or JSON). Every book is
+signed once (through the usual signature cache); each book whose author
+has another book is then attributed to its nearest other book under each
+candidate weighting, and the weighting with the most correct answers wins.
+
+The per-dimension distances between books are computed once, so scoring
+a block of candidate weightings is a single matrix product and thousands
+of them take seconds. Weights are relative to each dimension's spread
+across the corpus, and only their ratios matter, so the result is printed
+scaled to a largest weight of 1, ready for --weights.
+"""
+import argparse
+import itertools
+import math
+import os
+import random
+import time
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import improved_authorship_identification as aid
+
+np = aid.load_numpy()
+
+# Upper bound on cached (query, book, dimension) distances.
+_DIFF_CELLS = 1 << 24
+# Upper bound on (query, book, weighting) distances held at once.
+_SCORE_CELLS = 1 << 23
+# Weightings scored per call during a search.
+_CHUNK = 1024
+
+
+class LeaveOneOut:
+    """
+    Leave-one-out accuracy of weight vectors over fixed labelled signatures.
+
+    Books by authors with a single book are never queried (they cannot be
+    attributed correctly) but stay in as distractors. A query's nearest
+    other book is the first one on ties, as with find_best_match.
+    """
+
+    def __init__(self, sigs: Dict[str, List[float]], authors: Dict[str, str]) -> None:
+        self.keys = list(sigs)
+        self.rows = [list(sigs[k]) for k in self.keys]
+        self.width = len(self.rows[0]) if self.rows else 0
+        labels = [authors.get(k, k) for k in self.keys]
+        ids: Dict[str, int] = {}
+        self.labels = [ids.setdefault(label, len(ids)) for label in labels]
+        books = [0] * len(ids)
+        for label in self.labels:
+            books[label] += 1
+        self.queries = [i for i, label in enumerate(self.labels) if books[label] > 1]
+        self._diffs = None
+        if np is not None and self.queries:
+            x = np.array(self.rows, dtype=np.float64)
+            self._x = x
+            q = np.array(self.queries)
+            self._q = q
+            label_ids = np.array(self.labels)
+            self._same = label_ids[q][:, None] == label_ids[None, :]
+            if len(q) * len(x) * self.width <= _DIFF_CELLS:
+                self._diffs = self._block_diffs(0, len(q))
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+    def spread(self) -> List[float]:
+        """Standard deviation of each dimension across the books (1 where it is 0)."""
+        n = len(self.rows)
+        out = []
+        for j in range(self.width):
+            col = [row[j] for row in self.rows]
+            mean = sum(col) / n
+            sd = math.sqrt(sum((v - mean) ** 2 for v in col) / n)
+            out.append(sd if sd > 0 else 1.0)
+        return out
+
+    def _block_diffs(self, start: int, stop: int):
+        """|query - book| per dimension for queries[start:stop], shape (b, n, d)."""
+        return np.abs(self._x[self._q[start:stop], None, :] - self._x[None, :, :])
+
+    def accuracies(self, weightings: Sequence[Sequence[float]]) -> List[float]:
+        """Fraction of queries attributed to a book by the same author, per weighting."""
+        if not self.queries or not weightings:
+            return [0.0] * len(weightings)
+        if np is None:
+            return [self._accuracy_loop(w) for w in weightings]
+        w = np.asarray(weightings, dtype=np.float64).reshape(len(weightings), self.width)
+        n = len(self.rows)
+        correct = np.zeros(len(w))
+        step = max(1, _SCORE_CELLS // (n * len(w)))
+        for start in range(0, len(self.queries), step):
+            stop = min(start + step, len(self.queries))
+            diffs = self._diffs[start:stop] if self._diffs is not None else \
+                self._block_diffs(start, stop)
+            dist = diffs @ w.T  # (b, n, m)
+            rows = np.arange(stop - start)
+            dist[rows, self._q[start:stop], :] = np.inf
+            dist[np.isnan(dist)] = np.inf
+            nearest = dist.argmin(axis=1)  # (b, m)
+            correct += self._same[start:stop][rows[:, None], nearest].sum(axis=0)
+        return (correct / len(self.queries)).tolist()
+
+    def _accuracy_loop(self, weights: Sequence[float]) -> float:
+        correct = 0
+        for i in self.queries:
+            best, best_score = None, float('inf')
+            for j, row in enumerate(self.rows):
+                if j == i:
+                    continue
+                sc = aid.score_signature(row, self.rows[i], weights)
+                if sc < best_score:
+                    best, best_score = j, sc
+            correct += best is not None and self.labels[best] == self.labels[i]
+        return correct / len(self.queries)
+
+
+def _best_of(
+    loo: LeaveOneOut,
+    candidates: Iterable[List[float]],
+    best: Tuple[float, List[float]],
+    evaluated: List[int]
+) -> Tuple[float, List[float]]:
+    """Score `candidates` in chunks; keep the first weighting with the highest accuracy."""
+    it = iter(candidates)
+    while True:
+        chunk = list(itertools.islice(it, _CHUNK))
+        if not chunk:
+            return best
+        evaluated[0] += len(chunk)
+        for acc, w in zip(loo.accuracies(chunk), chunk):
+            if acc > best[0]:
+                best = (acc, w)
+
+
+def grid_search(
+    loo: LeaveOneOut,
+    values: Sequence[float],
+    scale: Sequence[float],
+    evaluated: List[int]
+) -> Tuple[float, List[float]]:
+    """Every combination of `values` per dimension (times `scale`), except all zeros."""
+    candidates = (
+        [v * s for v, s in zip(combo, scale)]
+        for combo in itertools.product(values, repeat=loo.width)
+        if any(combo)
+    )
+    return _best_of(loo, candidates, (-1.0, list(scale)), evaluated)
+
+
+def random_search(
+    loo: LeaveOneOut,
+    trials: int,
+    scale: Sequence[float],
+    seed: int,
+    evaluated: List[int]
+) -> Tuple[float, List[float]]:
+    """`trials` weightings drawn log-uniformly within x30 either way of `scale`."""
+    rng = random.Random(seed)
+    span = math.log(30)
+    candidates = itertools.chain(
+        [list(scale)],
+        ([s * math.exp(rng.uniform(-span, span)) for s in scale] for _ in range(trials - 1)),
+    )
+    return _best_of(loo, candidates, (-1.0, list(scale)), evaluated)
+
+
+def coordinate_descent(
+    loo: LeaveOneOut,
+    start: Sequence[float],
+    rounds: int,
+    evaluated: List[int],
+    factors: Sequence[float] = (0, 0.25, 0.5, 0.8, 1.25, 2, 4)
+) -> Tuple[float, List[float]]:
+    """
+    From `start`, repeatedly try scaling each single weight by each of
+    `factors` (all such moves scored as one batch) and take the best move,
+    until no move improves the accuracy or `rounds` is reached.
+    """
+    best = (loo.accuracies([list(start)])[0], list(start))
+    evaluated[0] += 1
+    for _ in range(rounds):
+        moves = []
+        for j in range(loo.width):
+            for f in factors:
+                w = list(best[1])
+                w[j] *= f
+                if any(w) and w != best[1]:
+                    moves.append(w)
+        improved = _best_of(loo, moves, best, evaluated)
+        if improved[0] <= best[0]:
+            break
+        best = improved
+    return best
+
+
+def _normalised(weights: Sequence[float]) -> List[float]:
+    top = max(weights)
+    return [float(f"{w / top:.6g}") for w in weights] if top > 0 else list(weights)
+
+
+# ─── CLI Entrypoint
+
+def main():
+    p = argparse.ArgumentParser(description="Calibrate signature weights on a labelled corpus")
+    p.add_argument('known_dir', help="One subdirectory of .txt books per author")
+    p.add_argument(
+        '--author-manifest',
+        metavar='FILE',
+        help="CSV (filename,author) or JSON labelling the flat .txt files in known_dir"
+    )
+    p.add_argument(
+        '--search',
+        choices=['coordinate', 'random', 'grid'],
+        default='coordinate',
+        help="Search strategy over the weight space"
+    )
+    p.add_argument(
+        '--grid',
+        metavar='VALUES',
+        default='0,0.25,0.5,1,2,4',
+        help="Comma-separated relative weights tried per dimension by --search grid"
+    )
+    p.add_argument('--trials', type=int, default=5000, help="Weightings tried by --search random")
+    p.add_argument('--rounds', type=int, default=50, help="Rounds of --search coordinate")
+    p.add_argument('--seed', type=int, default=0, help="Seed for --search random")
+    p.add_argument('--no-cache', action='store_true', help="Re-sign every book instead of using the cache")
+    p.add_argument(
+        '--jobs',
+        metavar='N',
+        type=int,
+        default=1,
+        help="Processes used to sign the books (0 = one per CPU)"
+    )
+    args = p.parse_args()
+    jobs = args.jobs or os.cpu_count() or 1
+
+    try:
+        sigs, authors = aid.load_labelled_signatures(
+            args.known_dir, args.author_manifest, not args.no_cache, jobs
+        )
+        grid = [float(v) for v in args.grid.split(',')]
+    except Exception as e:
+        print(f"Error: {e}")
+        exit(1)
+    loo = LeaveOneOut(sigs, authors)
+    if not len(loo):
+        print("Error: calibration needs at least one author with two or more books")
+        exit(1)
+
+    scale = [1 / sd for sd in loo.spread()]
+    equal, scaled = loo.accuracies([[1.0] * loo.width, scale])
+    evaluated = [0]
+    start = time.perf_counter()
+    if args.search == 'grid':
+        acc, weights = grid_search(loo, grid, scale, evaluated)
+    elif args.search == 'random':
+        acc, weights = random_search(loo, args.trials, scale, args.seed, evaluated)
+    else:
+        acc, weights = coordinate_descent(loo, scale, args.rounds, evaluated)
+    elapsed = time.perf_counter() - start
+
+    n = len(loo)
+    print(f"{len(sigs)} books, {len(set(authors.values()))} authors, {n} held out in turn")
+    print(f"{evaluated[0]} weightings scored in {elapsed:.2f}s")
+    for label, value in (('equal weights', equal), ('spread-scaled', scaled),
+                         (f"best ({args.search})", acc)):
+        print(f"  {label:<18} accuracy {value:.4f} ({round(value * n)}/{n})")
+    print("--weights " + ' '.join(f"{w:g}" for w in _normalised(weights)))
+
+
+if __name__ == '__main__':
+    main()
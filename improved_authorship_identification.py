@@ -3,21 +3,71 @@
 
 #!/usr/bin/env python3
 import os
+import sys
 import string
 import argparse
-from typing import List, Dict, Optional
+import bisect
+import codecs
+import csv
+import functools
+import glob
+import heapq
+import importlib
+import io
+import itertools
+import json
+import math
+import mmap
+import re
+import struct
+import time
+from collections import Counter, deque
+from collections.abc import Mapping
+from contextlib import nullcontext
+from array import array
+from typing import BinaryIO, Callable, List, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+# NumPy is optional and slow to import, so it is only loaded by
+# load_numpy() once a search is big enough to need it; until then `np` is None.
+np = None
+_numpy_tried = False
+
+# Below this many query x key distances a plain Python scan finishes before
+# NumPy would even have been imported.
+_VECTOR_MIN_CELLS = 50_000
+
+
+def load_numpy():
+    """Import NumPy on first call; the module, or None if it is not installed."""
+    global np, _numpy_tried
+    if not _numpy_tried:
+        _numpy_tried = True
+        try:
+            import numpy
+        except ImportError:  # vectorised search is optional
+            return None
+        np = numpy
+    return np
 
 # ─── Text-Signature Utilities 
 
 def clean_word(word: str) -> str:
     """Lowercase `word`, strip leading/trailing punctuation, preserve inner punctuation."""
-    w = word.strip().lower()
-    # strip leading/trailing punctuation
-    while w and w[0] in string.punctuation:
-        w = w[1:]
-    while w and w[-1] in string.punctuation:
-        w = w[:-1]
-    return w
+    # str.strip(chars) drops the punctuation from both ends in one C pass
+    return word.strip().lower().strip(string.punctuation)
+
+
+def clean_words(words: Iterable[str], drop_empty: bool = False) -> List[str]:
+    """`clean_word` applied to every word; with `drop_empty`, empty results are left out."""
+    punct = string.punctuation
+    cleaned = [w.strip().lower().strip(punct) for w in words]
+    if drop_empty:
+        return list(filter(None, cleaned))
+    return cleaned
+
+
+# Compiled character-class patterns for split_on_chars, keyed by `seps`.
+_SEPARATOR_PATTERNS: Dict[str, 're.Pattern[str]'] = {}
 
 
 def split_on_chars(text: str, seps: str) -> List[str]:
@@ -26,27 +76,17 @@ def split_on_chars(text: str, seps: str) -> List[str]:
     """
     if not text:
         return []
-    sep_set = set(seps)
-    parts: List[str] = []
-    buf: List[str] = []
-    for ch in text:
-        if ch in sep_set:
-            chunk = ''.join(buf).strip()
-            if chunk:
-                parts.append(chunk)
-            buf.clear()
-        else:
-            buf.append(ch)
-    # final chunk
-    chunk = ''.join(buf).strip()
-    if chunk:
-        parts.append(chunk)
-    return parts
+    pattern = _SEPARATOR_PATTERNS.get(seps)
+    if pattern is None:
+        if not seps:
+            chunk = text.strip()
+            return [chunk] if chunk else []
+        pattern = _SEPARATOR_PATTERNS[seps] = re.compile('[' + re.escape(seps) + ']')
+    return list(filter(None, map(str.strip, pattern.split(text))))
 
 
 def average_word_length(text: str) -> float:
-    words = [clean_word(w) for w in text.split()]
-    words = [w for w in words if w]
+    words = clean_words(text.split(), drop_empty=True)
     if not words:
         return 0.0
     return sum(len(w) for w in words) / len(words)
@@ -54,7 +94,7 @@ def average_word_length(text: str) -> float:
 
 def type_token_ratio(text: str) -> float:
     """Unique word count / total word count."""
-    words = [clean_word(w) for w in text.split() if clean_word(w)]
+    words = clean_words(text.split(), drop_empty=True)
     if not words:
         return 0.0
     return len(set(words)) / len(words)
@@ -62,7 +102,7 @@ def type_token_ratio(text: str) -> float:
 
 def hapax_legomena_ratio(text: str) -> float:
     """Words that occur exactly once / total word count."""
-    words = [clean_word(w) for w in text.split() if clean_word(w)]
+    words = clean_words(text.split(), drop_empty=True)
     if not words:
         return 0.0
     freq: Dict[str,int] = {}
@@ -98,94 +138,3045 @@ def average_sentence_complexity(text: str) -> float:
     return sum(phrase_counts) / len(sentences)
 
 
+# ─── Instrumentation 
+
+class Profiler:
+    """
+    Wall-clock time per pipeline stage and event counters for one run.
+
+    Stages: 'list' (directory listing), 'cache.lookup', 'cache.store',
+    'read', 'hash', 'decode', 'tokenize' (tokenizing plus the running
+    word/sentence/phrase counts), 'features' (turning counts into the
+    signature), 'score' and, with a process pool, 'pool' (wall time of the
+    pool; the stages inside workers are summed over all of them).
+    Counters: files, bytes, tokens, words, sentences, phrases, cache_hits.
+
+    `hook(stage, seconds)` is called as each timed span ends. Instrumented
+    code checks the module-level profiler once per file or chunk, so
+    nothing is measured and next to nothing is spent while none is enabled.
+    """
+
+    def __init__(self, hook: Optional[Callable[[str, float], None]] = None) -> None:
+        self.hook = hook
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {}
+        self._open: set = set()
+        self._started = time.perf_counter()
+        self._lap = self._started
+
+    def add_time(self, stage: str, seconds: float, calls: int = 1) -> None:
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + calls
+        if self.hook is not None:
+            self.hook(stage, seconds)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def lap(self, stage: Optional[str] = None) -> None:
+        """Charge the time since the previous lap to `stage` (None only restarts)."""
+        now = time.perf_counter()
+        if stage is not None:
+            self.add_time(stage, now - self._lap)
+        self._lap = now
+
+    def stage(self, name: str) -> '_Stage':
+        """Context manager timing its body as `name`."""
+        return _Stage(self, name)
+
+    def merge(self, other: Dict[str, object]) -> None:
+        """Add the stages and counters of another profiler's `report()`."""
+        for name, st in other['stages'].items():
+            self.seconds[name] = self.seconds.get(name, 0.0) + st['seconds']
+            self.calls[name] = self.calls.get(name, 0) + st['calls']
+        for name, n in other['counters'].items():
+            self.count(name, n)
+
+    def report(self) -> Dict[str, object]:
+        """JSON-ready stats, with throughput over the wall time so far."""
+        wall = time.perf_counter() - self._started
+        rates = {}
+        for name in ('files', 'bytes', 'tokens'):
+            if name in self.counters and wall > 0:
+                rates[f'{name}_per_second'] = self.counters[name] / wall
+        return {
+            'wall_seconds': wall,
+            'stages': {
+                name: {'seconds': self.seconds[name], 'calls': self.calls[name]}
+                for name in sorted(self.seconds, key=self.seconds.get, reverse=True)
+            },
+            'counters': dict(self.counters),
+            'rates': rates,
+        }
+
+
+class _Stage:
+    __slots__ = ('prof', 'name', 'start')
+
+    def __init__(self, prof: Profiler, name: str) -> None:
+        self.prof = prof
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        self.prof.add_time(self.name, time.perf_counter() - self.start)
+
+
+# The profiler instrumented code reports to; None when profiling is off.
+_profiler: Optional[Profiler] = None
+_NO_STAGE = nullcontext()
+
+
+def enable_profiling(profiler: Optional[Profiler] = None) -> Profiler:
+    """Start collecting stats into `profiler` (a new one if not given) and return it."""
+    global _profiler
+    _profiler = profiler if profiler is not None else Profiler()
+    return _profiler
+
+
+def disable_profiling() -> Optional[Profiler]:
+    """Stop collecting; return the profiler that was active, if any."""
+    global _profiler
+    prof, _profiler = _profiler, None
+    return prof
+
+
+def _stage(name: str):
+    """`Profiler.stage(name)` of the active profiler, or a no-op."""
+    prof = _profiler
+    return _NO_STAGE if prof is None else _Stage(prof, name)
+
+
+def _timed(stage: str):
+    """Decorator charging calls to `stage`; nested calls are only counted once."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            prof = _profiler
+            if prof is None or stage in prof._open:
+                return fn(*args, **kwargs)
+            prof._open.add(stage)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                prof._open.discard(stage)
+                prof.add_time(stage, time.perf_counter() - start)
+        return timed
+    return wrap
+
+
+def _count_signed(prof: Profiler, acc: 'SignatureAccumulator', n_bytes: int) -> None:
+    prof.count('files')
+    prof.count('bytes', n_bytes)
+    prof.count('tokens', acc.tokens)
+    prof.count('words', sum(acc.freq.values()))
+    prof.count('sentences', acc.sentences + acc._in_sentence)
+    prof.count('phrases', acc.phrases + acc._in_phrase)
+
+
+# ─── Single-Pass Signature Engine 
+
+SENTENCE_SEPS = '.?!'
+PHRASE_SEPS = ',;:'
+
+# A whitespace-free token reduces to a short run of events: ordinary
+# characters, phrase separators and sentence terminators.
+_CONTENT, _PHRASE_END, _SENTENCE_END = 0, 1, 2
+_PLAIN_TOKEN = (_CONTENT,)
+
+
+def _token_shape(token: str) -> Tuple[int, ...]:
+    """Collapse `token` into its sequence of content/separator events."""
+    events: List[int] = []
+    for ch in token:
+        if ch in SENTENCE_SEPS:
+            ev = _SENTENCE_END
+        elif ch in PHRASE_SEPS:
+            ev = _PHRASE_END
+        else:
+            ev = _CONTENT
+        if not events or events[-1] != ev:
+            events.append(ev)
+    if events == [_CONTENT]:
+        return _PLAIN_TOKEN
+    return tuple(events)
+
+
+# Cap on memoised distinct tokens, so streaming huge inputs stays flat.
+_TOKEN_MEMO_LIMIT = 200_000
+
+# Bytes read per chunk when signing files.
+CHUNK_SIZE = 1 << 20
+
+# Files at least this large are memory-mapped rather than read.
+MMAP_THRESHOLD = 1 << 20
+
+# bytes.split() whitespace; str.split() also splits on \x1c-\x1f.
+_ASCII_SPACE = b' \t\n\r\x0b\x0c'
+_STR_ONLY_SPACE = (b'\x1c', b'\x1d', b'\x1e', b'\x1f')
+_LEADING_TOKEN = re.compile(rb'[^ \t\n\r\x0b\x0c]*')
+
+
+class SignatureAccumulator:
+    """
+    Build a signature while walking the text exactly once.
+
+    Every whitespace token is cleaned and classified a single time (results
+    are memoised per distinct token), feeding a word-frequency table for the
+    three word features and a small sentence/phrase state machine for the
+    other two. `signature()` returns the same values as the five separate
+    feature functions.
+
+    Text may be fed in arbitrary chunks: a token cut by a chunk edge is held
+    back until the next `update()`, and sentence/phrase state carries over,
+    so the result equals `make_signature` of the concatenated input.
+    """
+
+    def __init__(self, keep_tokens: bool = False, sketch: Optional['WordSketch'] = None) -> None:
+        self.freq: Dict[str, int] = {}
+        # with a sketch, `freq` is only a buffer spilled into it when it grows
+        self.sketch = sketch
+        # raw (uncleaned) token counts, only kept when a feature needs them
+        self.token_freq: Optional[Dict[Union[str, bytes], int]] = {} if keep_tokens else None
+        self.sentences = 0
+        self.sentence_words = 0
+        self.phrases = 0
+        # whitespace tokens consumed, for profiling
+        self.tokens = 0
+        # open-state of the sentence / phrase currently being read
+        self._in_sentence = False
+        self._in_phrase = False
+        # trailing token of the last chunk, possibly cut mid-word
+        self._pending = ''
+        self._tokens: Dict[Union[str, bytes], Tuple[str, Tuple[int, ...]]] = {}
+        # a sketch promises flat memory, so its token memo is kept as small as its buffer
+        self._memo_limit = _TOKEN_MEMO_LIMIT if sketch is None else SKETCH_BUFFER
+
+    def update(self, text: str) -> None:
+        """Consume the next chunk of text."""
+        if self._pending:
+            text = self._pending + text
+            self._pending = ''
+        if not text:
+            return
+        tokens = text.split()
+        if tokens and not text[-1].isspace():
+            self._pending = tokens.pop()
+        self._consume(tokens)
+
+    def update_ascii(self, data: bytes) -> None:
+        """
+        `update()` for a chunk of ASCII bytes, tokenized directly on the bytes
+        so the chunk is never decoded as a whole; tokens are decoded only the
+        first time they are seen. The bytes must not contain the
+        information separators \\x1c-\\x1f, which str.split() treats as
+        whitespace but bytes.split() does not.
+        """
+        if self._pending:
+            # finish the token cut by the previous chunk edge
+            head = _LEADING_TOKEN.match(data).group()
+            self._pending += head.decode('ascii')
+            if len(head) == len(data):
+                return
+            data = data[len(head):]
+            self.flush()
+        tokens = data.split()
+        if tokens and data[-1] not in _ASCII_SPACE:
+            self._pending = tokens.pop().decode('ascii')
+        self._consume(tokens)
+
+    def flush(self) -> None:
+        """Finish the token left open at the end of the input."""
+        if self._pending:
+            tokens = [self._pending]
+            self._pending = ''
+            self._consume(tokens)
+
+    def _consume(self, tokens: List[Union[str, bytes]]) -> None:
+        freq = self.freq
+        memo = self._tokens
+        sentences = self.sentences
+        words = self.sentence_words
+        phrases = self.phrases
+        in_sentence = self._in_sentence
+        in_phrase = self._in_phrase
+        if len(memo) > self._memo_limit:
+            memo.clear()
+        self.tokens += len(tokens)
+        token_freq = self.token_freq
+        if token_freq is not None:
+            for tok in tokens:
+                token_freq[tok] = token_freq.get(tok, 0) + 1
+        for tok in tokens:
+            entry = memo.get(tok)
+            if entry is None:
+                word = tok if isinstance(tok, str) else tok.decode('ascii')
+                entry = memo[tok] = (clean_word(word), _token_shape(word))
+            cleaned, shape = entry
+            if cleaned:
+                freq[cleaned] = freq.get(cleaned, 0) + 1
+            if shape is _PLAIN_TOKEN:
+                in_sentence = in_phrase = True
+                words += 1
+                continue
+            in_word = False
+            for ev in shape:
+                if ev == _CONTENT:
+                    in_sentence = in_phrase = in_word = True
+                elif ev == _PHRASE_END:
+                    in_sentence = in_word = True
+                    if in_phrase:
+                        phrases += 1
+                        in_phrase = False
+                else:
+                    if in_word:
+                        words += 1
+                        in_word = False
+                    if in_phrase:
+                        phrases += 1
+                        in_phrase = False
+                    if in_sentence:
+                        sentences += 1
+                        in_sentence = False
+            if in_word:
+                words += 1
+        self.sentences = sentences
+        self.sentence_words = words
+        self.phrases = phrases
+        self._in_sentence = in_sentence
+        self._in_phrase = in_phrase
+        if self.sketch is not None and len(freq) > SKETCH_BUFFER:
+            self.sketch.absorb(freq)
+            freq.clear()
+
+    def signature(self) -> List[float]:
+        """
+        Return the 5-element signature of everything consumed so far. Once
+        a sketch has taken words the three word features are its estimates.
+        """
+        self.flush()
+        freq = self.freq
+        sketch = self.sketch
+        if sketch is not None and sketch.words:
+            sketch.absorb(freq)
+            freq.clear()
+            total = sketch.words
+            distinct = sketch.distinct()
+            word_len = sketch.length_sum / total
+            ttr = distinct / total
+            hapax = distinct * sketch.sample.once_fraction() / total
+        else:
+            total = sum(freq.values())
+            if total:
+                word_len = sum(len(w) * n for w, n in freq.items()) / total
+                ttr = len(freq) / total
+                hapax = sum(1 for n in freq.values() if n == 1) / total
+            else:
+                word_len = ttr = hapax = 0.0
+        sentences = self.sentences + self._in_sentence
+        phrases = self.phrases + self._in_phrase
+        if sentences:
+            sent_len = self.sentence_words / sentences
+            complexity = phrases / sentences
+        else:
+            sent_len = complexity = 0.0
+        return [word_len, ttr, hapax, sent_len, complexity]
+
+
+def _count_pieces(text: str, sep: str) -> int:
+    """Non-empty pieces of `text` split on `sep`."""
+    pieces = text.split(sep)
+    return len(pieces) - pieces.count('')
+
+
 def make_signature(text: str) -> List[float]:
     """
     Compute the 5-element signature of `text`:
       [avg_word_len, type_token_ratio, hapax_legomena_ratio,
        avg_sentence_length, avg_sentence_complexity]
+
+    A whole string is counted with a few C-level passes instead of the
+    accumulator's per-token state machine: each distinct token is cleaned
+    once, and with the whitespace removed a sentence or phrase is any
+    non-empty piece between separators. The counts, and so the values,
+    are the same as SignatureAccumulator's.
     """
-    return [
-        average_word_length(text),
-        type_token_ratio(text),
-        hapax_legomena_ratio(text),
-        average_sentence_length(text),
-        average_sentence_complexity(text),
-    ]
+    tokens = text.split()
+    counts = Counter(tokens)
+    freq: Dict[str, int] = {}
+    for cleaned, n in zip(clean_words(counts), counts.values()):
+        if cleaned:
+            freq[cleaned] = freq.get(cleaned, 0) + n
+    joined = ''.join(tokens).replace('?', '.').replace('!', '.')
+    acc = SignatureAccumulator()
+    acc.freq = freq
+    acc.sentences = _count_pieces(joined, '.')
+    acc.phrases = _count_pieces(joined.replace(',', '.').replace(';', '.').replace(':', '.'), '.')
+    acc.sentence_words = len(text.replace('.', ' ').replace('?', ' ').replace('!', ' ').split())
+    return acc.signature()
 
 
-# ─── Author-Attribution Core 
+# ─── Sketches 
 
-def get_all_signatures(known_dir: str) -> Dict[str, List[float]]:
-    """Read every .txt file in `known_dir` and return {filename: signature}."""
-    sigs: Dict[str, List[float]] = {}
-    for fname in os.listdir(known_dir):
-        if not fname.lower().endswith('.txt'):
-            continue
-        path = os.path.join(known_dir, fname)
-        with open(path, 'r', encoding='utf-8') as f:
-            sigs[fname] = make_signature(f.read())
-    return sigs
+# HyperLogLog registers are 2**HLL_PRECISION bytes.
+HLL_PRECISION = 12
+# Distinct words whose exact counts a HashSample keeps.
+SAMPLE_SIZE = 4096
+# Distinct words a sketching accumulator counts exactly before spilling.
+SKETCH_BUFFER = 1 << 15
 
+# Hashed character n-grams: n-gram length and number of buckets.
+NGRAM_SIZE = 3
+NGRAM_BUCKETS = 64
 
-def score_signature(sig1: List[float], sig2: List[float], weights: List[float]) -> float:
-    """Compute weighted sum of absolute differences between two signatures."""
-    return sum(w * abs(a - b) for a, b, w in zip(sig1, sig2, weights))
 
+def char_ngram_counts(freq: Dict[str, int], counts: Optional[List[int]] = None) -> List[int]:
+    """
+    Add the NGRAM_SIZE-grams of each word in `freq` (padded with a space at
+    each end, weighted by its count) into NGRAM_BUCKETS CRC-32 buckets,
+    which are stable across processes. Counts are additive, so a text may
+    be tallied in pieces.
+    """
+    import zlib
+    if counts is None:
+        counts = [0] * NGRAM_BUCKETS
+    crc32 = zlib.crc32
+    for w, n in freq.items():
+        padded = f' {w} '
+        for i in range(len(padded) - NGRAM_SIZE + 1):
+            counts[crc32(padded[i:i + NGRAM_SIZE].encode('utf-8')) % NGRAM_BUCKETS] += n
+    return counts
 
-def find_best_match(
-    mystery_sig: List[float],
-    known_sigs: Dict[str, List[float]],
-    weights: List[float]
-) -> Optional[str]:
-    """Return the filename whose signature is closest to `mystery_sig`."""
-    best_key: Optional[str] = None
-    best_score = float('inf')
-    for key, sig in known_sigs.items():
-        sc = score_signature(sig, mystery_sig, weights)
-        if sc < best_score:
-            best_score, best_key = sc, key
-    return best_key
 
+class HyperLogLog:
+    """
+    Distinct-count estimate from 2**p one-byte registers fed 64-bit hashes.
 
-def process_data(mystery_path: str, known_dir: str, weights: List[float]) -> Optional[str]:
+    The relative standard error is 1.04 / sqrt(2**p): 1.6% at p = 12
+    (4 KiB), so about 95% of estimates land within 3.3% of the truth.
+    Small counts use linear counting and are near exact.
     """
-    Read `mystery_path`, compute its signature, compare to known_dir,
-    and return the best-matching filename (or None if no files).
+
+    def __init__(self, p: int = HLL_PRECISION) -> None:
+        self.p = p
+        self.registers = bytearray(1 << p)
+        self._rest = (1 << (64 - p)) - 1
+
+    def add(self, h: int) -> None:
+        rank = 64 - self.p - (h & self._rest).bit_length() + 1
+        i = h >> (64 - self.p)
+        if rank > self.registers[i]:
+            self.registers[i] = rank
+
+    def count(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)
+        return estimate
+
+
+class HashSample:
     """
-    if not os.path.isfile(mystery_path):
-        raise FileNotFoundError(f"Mystery file not found: {mystery_path}")
-    known_sigs = get_all_signatures(known_dir)
-    if not known_sigs:
-        return None
-    with open(mystery_path, 'r', encoding='utf-8') as f:
-        mystery_sig = make_signature(f.read())
-    return find_best_match(mystery_sig, known_sigs, weights)
+    Exact counts for the distinct words whose 64-bit hash falls below a
+    threshold, halved whenever more than `size` words qualify. Membership
+    depends only on the hash, so a sampled word has every occurrence
+    counted and the sample is uniform over the vocabulary.
 
+    Proportions over the vocabulary (such as the share of words seen once)
+    are estimated from between size/2 and size words: the standard error
+    is sqrt(f(1 - f) / n), at most 1.1 percentage points with size = 4096.
+    Below `size` distinct words the sample is the whole vocabulary.
+    """
 
-# ─── CLI Entrypoint 
+    def __init__(self, size: int = SAMPLE_SIZE) -> None:
+        self.size = size
+        self.limit = 1 << 64
+        self.counts: Dict[int, int] = {}
 
-def main():
-    p = argparse.ArgumentParser(description="Attribution via text signatures")
-    p.add_argument('known_dir', help="Directory of known-author .txt files")
-    p.add_argument('mystery_file', help="Path to the mystery .txt file")
-    p.add_argument(
-        '--weights',
-        nargs=5,
-        type=float,
-        default=[1,1,1,1,1],
-        help="Five weights for the signature dimensions"
-    )
-    args = p.parse_args()
+    def add(self, h: int, n: int = 1) -> None:
+        if h < self.limit:
+            counts = self.counts
+            counts[h] = counts.get(h, 0) + n
+            if len(counts) > self.size:
+                while len(counts) > self.size:
+                    self.limit >>= 1
+                    counts = {k: c for k, c in counts.items() if k < self.limit}
+                self.counts = counts
+
+    def once_fraction(self) -> float:
+        """Share of the sampled words seen exactly once."""
+        if not self.counts:
+            return 0.0
+        return sum(1 for c in self.counts.values() if c == 1) / len(self.counts)
+
+
+class WordSketch:
+    """
+    Fixed-size summary of a text's word counts, for vocabularies too big
+    to hold: total words and letters (exact), a HyperLogLog for the number
+    of distinct words, a HashSample for the share of them seen once, and
+    optionally the hashed character n-gram counts (exact).
+
+    The type-token ratio then carries the HyperLogLog's error (1.6%
+    standard error); the hapax ratio combines it with the sample's, for
+    about 2.7% standard error when half the vocabulary is hapax. The
+    sketch itself takes under 1 MB whatever the vocabulary size. Word
+    counts arrive in batches through `absorb`; a word may appear in any
+    number of batches, so the estimates do not depend on chunking.
+    """
+
+    def __init__(self, ngrams: bool = False) -> None:
+        import hashlib  # only needed in sketch mode
+        self._blake2b = hashlib.blake2b
+        self.hll = HyperLogLog()
+        self.sample = HashSample()
+        self.words = 0
+        self.length_sum = 0
+        self.ngrams: Optional[List[int]] = [0] * NGRAM_BUCKETS if ngrams else None
+
+    def absorb(self, freq: Dict[str, int]) -> None:
+        """Add a batch of {word: count}."""
+        blake2b = self._blake2b
+        hll_add = self.hll.add
+        sample_add = self.sample.add
+        for w, n in freq.items():
+            digest = blake2b(w.encode('utf-8'), digest_size=8).digest()
+            h = int.from_bytes(digest, 'little')
+            hll_add(h)
+            sample_add(h, n)
+            self.words += n
+            self.length_sum += len(w) * n
+        if self.ngrams is not None:
+            char_ngram_counts(freq, self.ngrams)
+
+    def distinct(self) -> float:
+        """Estimated number of distinct words (never more than the word count)."""
+        return min(self.hll.count(), self.words)
+
+
+# ─── Feature Registry 
+
+class TextStats:
+    """What the shared tokenization pass counted, as handed to Feature.compute."""
+
+    __slots__ = ('freq', 'words', 'token_freq', 'sentences', 'sentence_words', 'phrases',
+                 'base', 'ngrams')
+
+    def __init__(self, acc: SignatureAccumulator) -> None:
+        self.base = acc.signature()  # also flushes the last token
+        # in sketch mode the word table is partial; features needing it are refused
+        self.freq = acc.freq
+        self.words = sum(acc.freq.values())
+        self.ngrams: Optional[List[int]] = None
+        if acc.sketch is not None:
+            self.words += acc.sketch.words
+            if acc.sketch.ngrams is not None:
+                self.ngrams = char_ngram_counts(acc.freq, list(acc.sketch.ngrams))
+        self.token_freq: Optional[Dict[str, int]] = None
+        if acc.token_freq is not None:
+            self.token_freq = {}
+            for tok, n in acc.token_freq.items():
+                if isinstance(tok, bytes):
+                    tok = tok.decode('ascii')
+                self.token_freq[tok] = self.token_freq.get(tok, 0) + n
+        self.sentences = acc.sentences + acc._in_sentence
+        self.sentence_words = acc.sentence_words
+        self.phrases = acc.phrases + acc._in_phrase
+
+
+class Feature:
+    """
+    A block of signature values computed from one shared pass over the text.
+
+    `needs` says what the pass must collect: 'words' (cleaned word totals)
+    and 'sentences' (sentence, word and phrase totals) are always there;
+    'vocabulary' (the exact count of every distinct word) is too, except
+    in sketch mode; 'tokens' (raw token counts, punctuation intact) costs
+    extra and is only gathered when some feature in the set asks for it.
+    """
+
+    needs: Tuple[str, ...] = ('words',)
+
+    def labels(self) -> List[str]:
+        """One name per value `compute` returns."""
+        raise NotImplementedError
+
+    def compute(self, stats: TextStats) -> List[float]:
+        raise NotImplementedError
+
+
+# name -> Feature factory; see register_feature
+FEATURES: Dict[str, Callable[[], Feature]] = {}
+
+
+def register_feature(name: str):
+    """Class decorator adding a Feature (constructed with no arguments) under `name`."""
+    def wrap(cls):
+        FEATURES[name] = cls
+        return cls
+    return wrap
+
+
+class _BaseValue(Feature):
+    """One of the five original signature values."""
+
+    index = 0
+    needs = ('words', 'sentences')
+
+    def labels(self) -> List[str]:
+        return [self.name]
+
+    def compute(self, stats: TextStats) -> List[float]:
+        return [stats.base[self.index]]
+
+
+DEFAULT_FEATURES = (
+    'word_length', 'type_token_ratio', 'hapax_ratio', 'sentence_length', 'sentence_complexity'
+)
+for _i, _name in enumerate(DEFAULT_FEATURES):
+    register_feature(_name)(type(_name, (_BaseValue,), {'index': _i, 'name': _name}))
+
+
+FUNCTION_WORDS = (
+    'the', 'of', 'and', 'to', 'a', 'in', 'that', 'it', 'is', 'was', 'i', 'for', 'on',
+    'you', 'he', 'be', 'with', 'as', 'by', 'at', 'have', 'are', 'this', 'not', 'but',
+    'had', 'his', 'they', 'from', 'she', 'which', 'or', 'we', 'an', 'there', 'her',
+    'were', 'one', 'do', 'been', 'all', 'their', 'has', 'would', 'will', 'what',
+    'if', 'can', 'when', 'so', 'upon', 'shall', 'must', 'though', 'while',
+)
+
+
+@register_feature('function_words')
+class FunctionWords(Feature):
+    """Relative frequency of each of FUNCTION_WORDS."""
+
+    needs = ('vocabulary',)
+
+    def labels(self) -> List[str]:
+        return [f'function_words[{w}]' for w in FUNCTION_WORDS]
+
+    def compute(self, stats: TextStats) -> List[float]:
+        if not stats.words:
+            return [0.0] * len(FUNCTION_WORDS)
+        return [stats.freq.get(w, 0) / stats.words for w in FUNCTION_WORDS]
+
+
+@register_feature('word_length_histogram')
+class WordLengthHistogram(Feature):
+    """Share of words of each length 1..MAX_LEN, the last bin holding longer ones too."""
+
+    MAX_LEN = 15
+    needs = ('vocabulary',)
+
+    def labels(self) -> List[str]:
+        return [f'word_length[{n}]' for n in range(1, self.MAX_LEN)] + [f'word_length[{self.MAX_LEN}+]']
+
+    def compute(self, stats: TextStats) -> List[float]:
+        bins = [0] * self.MAX_LEN
+        for w, n in stats.freq.items():
+            bins[min(len(w), self.MAX_LEN) - 1] += n
+        return [b / stats.words if stats.words else 0.0 for b in bins]
+
+
+@register_feature('char_ngrams')
+class CharNgrams(Feature):
+    """
+    Character n-gram profile: the share of each hash bucket among the
+    n-grams of the words (see `char_ngram_counts`), counted from the word
+    table so the text is not scanned again. In sketch mode the sketch
+    keeps the same counts as it goes, so the values are identical.
+    """
+
+    def labels(self) -> List[str]:
+        return [f'char_{NGRAM_SIZE}grams[{b}]' for b in range(NGRAM_BUCKETS)]
+
+    def compute(self, stats: TextStats) -> List[float]:
+        counts = stats.ngrams if stats.ngrams is not None else char_ngram_counts(stats.freq)
+        total = sum(counts)
+        return [c / total if total else 0.0 for c in counts]
+
+
+PUNCTUATION_MARKS = '.,;:!?\'"-()'
+
+
+@register_feature('punctuation')
+class Punctuation(Feature):
+    """Occurrences of each of PUNCTUATION_MARKS per token."""
+
+    needs = ('tokens',)
+
+    def labels(self) -> List[str]:
+        return [f'punctuation[{c}]' for c in PUNCTUATION_MARKS]
+
+    def compute(self, stats: TextStats) -> List[float]:
+        counts = dict.fromkeys(PUNCTUATION_MARKS, 0)
+        tokens = 0
+        for tok, n in stats.token_freq.items():
+            tokens += n
+            for c in tok:
+                if c in counts:
+                    counts[c] += n
+        return [counts[c] / tokens if tokens else 0.0 for c in PUNCTUATION_MARKS]
+
+
+class FeatureSet:
+    """
+    An ordered selection of registered features, producing one flat
+    vector per text from a single tokenization pass. The default set is
+    the original five values, identical to make_signature.
+
+    With `sketch`, word statistics go through a WordSketch, so memory
+    per text no longer grows with its vocabulary; the type-token and
+    hapax ratios become estimates (see WordSketch for their error).
+    """
+
+    def __init__(self, names: Iterable[str] = DEFAULT_FEATURES, sketch: bool = False) -> None:
+        self.names = tuple(names)
+        self.sketch = sketch
+        unknown = [n for n in self.names if n not in FEATURES]
+        if unknown:
+            raise ValueError(
+                f"unknown feature(s) {', '.join(unknown)}; choose from {', '.join(FEATURES)}"
+            )
+        self.features = [FEATURES[n]() for n in self.names]
+        if sketch:
+            exact = [n for n, f in zip(self.names, self.features)
+                     if 'vocabulary' in f.needs or 'tokens' in f.needs]
+            if exact:
+                raise ValueError(f"feature(s) {', '.join(exact)} cannot be sketched")
+        self.labels = [label for f in self.features for label in f.labels()]
+        self.width = len(self.labels)
+        self._keep_tokens = any('tokens' in f.needs for f in self.features)
+
+    @classmethod
+    def parse(cls, spec: str, sketch: bool = False) -> 'FeatureSet':
+        """From 'default,function_words,...'; 'default' stands for the original five."""
+        names: List[str] = []
+        for name in filter(None, (n.strip() for n in spec.split(','))):
+            names.extend(DEFAULT_FEATURES if name == 'default' else [name])
+        return cls(names, sketch)
+
+    @property
+    def key(self) -> str:
+        """Short id of the selection ('' for the default set), e.g. for cache tables."""
+        if self.names == DEFAULT_FEATURES and not self.sketch:
+            return ''
+        import zlib
+        spec = ','.join(self.names) + (';sketch' if self.sketch else '')
+        return f"{zlib.crc32(spec.encode()):08x}"
+
+    def accumulator(self) -> SignatureAccumulator:
+        sketch = None
+        if self.sketch:
+            sketch = WordSketch(ngrams=any(isinstance(f, CharNgrams) for f in self.features))
+        return SignatureAccumulator(self._keep_tokens, sketch)
+
+    def vector(self, acc: SignatureAccumulator) -> List[float]:
+        """The feature vector of everything `acc` has consumed."""
+        stats = TextStats(acc)
+        if self.names == DEFAULT_FEATURES:
+            return stats.base
+        out: List[float] = []
+        for f in self.features:
+            out.extend(f.compute(stats))
+        return out
+
+    def __reduce__(self):
+        # by name, so sets built from runtime-registered features reach pool workers
+        return FeatureSet, (self.names, self.sketch)
+
+    def sign_text(self, text: str) -> List[float]:
+        acc = self.accumulator()
+        acc.update(text)
+        return self.vector(acc)
+
+
+def _new_accumulator(features: Optional[FeatureSet]) -> SignatureAccumulator:
+    return SignatureAccumulator() if features is None else features.accumulator()
+
+
+def _finish(acc: SignatureAccumulator, features: Optional[FeatureSet]) -> List[float]:
+    return acc.signature() if features is None else features.vector(acc)
+
+
+def sign_file(
+    path: str,
+    chunk_size: int = CHUNK_SIZE,
+    hasher=None,
+    features: Optional[FeatureSet] = None
+) -> List[float]:
+    """
+    Signature of the UTF-8 file at `path`, streamed `chunk_size` bytes at a
+    time so memory does not grow with the file size. If `hasher` (a hashlib
+    object) is given it is fed the raw bytes on the way through. Files of
+    MMAP_THRESHOLD bytes or more are memory-mapped (see `sign_mapped_file`).
+    With `features` the result is that FeatureSet's vector instead.
+    """
+    with open(path, 'rb') as f:
+        mm = None
+        try:
+            if os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            pass  # not mappable: fall back to reading
+        # only the setup is guarded: a decode error must not restart the file
+        if mm is None:
+            return sign_stream(f, chunk_size, hasher, features)
+        with mm:
+            return _sign_map(mm, chunk_size, hasher, features)
+
+
+def sign_stream(
+    f: BinaryIO,
+    chunk_size: int = CHUNK_SIZE,
+    hasher=None,
+    features: Optional[FeatureSet] = None
+) -> List[float]:
+    """
+    Signature of the UTF-8 text read from the binary file object `f`
+    (a decompressor or archive member works as well as a plain file).
+    """
+    acc = _new_accumulator(features)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    prof = _profiler
+    if prof is not None:
+        prof.lap()
+    size = 0
+    for block in iter(lambda: f.read(chunk_size), b''):
+        if prof is not None:
+            prof.lap('read')
+            size += len(block)
+        if hasher is not None:
+            hasher.update(block)
+            if prof is not None:
+                prof.lap('hash')
+        text = decoder.decode(block)
+        if prof is not None:
+            prof.lap('decode')
+        acc.update(text)
+        if prof is not None:
+            prof.lap('tokenize')
+    acc.update(decoder.decode(b'', final=True))
+    if prof is None:
+        return _finish(acc, features)
+    acc.flush()
+    prof.lap('tokenize')
+    sig = _finish(acc, features)
+    prof.lap('features')
+    _count_signed(prof, acc, size)
+    return sig
 
+
+def sign_mapped_file(
+    path: str,
+    chunk_size: int = CHUNK_SIZE,
+    hasher=None,
+    features: Optional[FeatureSet] = None
+) -> List[float]:
+    """
+    `sign_file` over a read-only memory map of `path`. Pure-ASCII chunks are
+    tokenized straight from the mapped bytes; any chunk with other bytes
+    goes through the incremental UTF-8 decoder, so the result is identical.
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return _sign_map(mm, chunk_size, hasher, features)
+
+
+def _sign_map(mm: mmap.mmap, chunk_size: int, hasher, features: Optional[FeatureSet]) -> List[float]:
+    acc = _new_accumulator(features)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    prof = _profiler
+    if prof is not None:
+        prof.lap()
+    can_advise = hasattr(mm, 'madvise')
+    if can_advise:
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+    released = 0
+    for start in range(0, len(mm), chunk_size):
+        block = mm[start:start + chunk_size]
+        if prof is not None:
+            prof.lap('read')
+        if hasher is not None:
+            hasher.update(block)
+            if prof is not None:
+                prof.lap('hash')
+        # the decoder must be empty: it may hold a split multi-byte char
+        if (block.isascii() and not decoder.getstate()[0]
+                and not any(sep in block for sep in _STR_ONLY_SPACE)):
+            if prof is not None:
+                prof.lap('decode')
+            acc.update_ascii(block)
+        else:
+            text = decoder.decode(block)
+            if prof is not None:
+                prof.lap('decode')
+            acc.update(text)
+        if prof is not None:
+            prof.lap('tokenize')
+        if can_advise:
+            # drop the whole pages already consumed so RSS stays flat
+            done = (start + len(block)) // mmap.PAGESIZE * mmap.PAGESIZE
+            if done > released:
+                mm.madvise(mmap.MADV_DONTNEED, released, done - released)
+                released = done
+    size = len(mm)
+    acc.update(decoder.decode(b'', final=True))
+    if prof is None:
+        return _finish(acc, features)
+    acc.flush()
+    prof.lap('tokenize')
+    sig = _finish(acc, features)
+    prof.lap('features')
+    _count_signed(prof, acc, size)
+    return sig
+
+
+# ─── Windowed Signatures 
+
+# state left after a token, by its last event: (in_sentence, in_phrase)
+_EXIT_STATE = {_CONTENT: (True, True), _PHRASE_END: (True, False), _SENTENCE_END: (False, False)}
+# state at the start of the text
+_OPEN = (False, False)
+_SHAPE_COUNTS: Dict[Tuple[Tuple[int, ...], bool, bool], Tuple[int, int, int]] = {}
+
+
+def _shape_counts(shape: Tuple[int, ...], in_sentence: bool, in_phrase: bool) -> Tuple[int, int, int]:
+    """(sentences, words, phrases) closed by a token of `shape` entered in the given state."""
+    key = (shape, in_sentence, in_phrase)
+    counts = _SHAPE_COUNTS.get(key)
+    if counts is not None:
+        return counts
+    sentences = words = phrases = 0
+    in_word = False
+    for ev in shape:
+        if ev == _CONTENT:
+            in_sentence = in_phrase = in_word = True
+        elif ev == _PHRASE_END:
+            in_sentence = in_word = True
+            if in_phrase:
+                phrases += 1
+                in_phrase = False
+        else:
+            if in_word:
+                words += 1
+                in_word = False
+            if in_phrase:
+                phrases += 1
+                in_phrase = False
+            if in_sentence:
+                sentences += 1
+                in_sentence = False
+    if in_word:
+        words += 1
+    counts = _SHAPE_COUNTS[key] = (sentences, words, phrases)
+    return counts
+
+
+class SignatureWindow:
+    """
+    Signature of the last `size` whitespace tokens pushed, kept up to date
+    in O(1) per token, so sliding a window by `step` tokens costs O(step)
+    rather than re-signing the whole window.
+
+    Word features come from a frequency table that tokens enter and leave,
+    with running totals of characters and hapax words. The state a token
+    leaves the sentence/phrase machine in depends only on its own last
+    character, so each token's sentence, word and phrase counts are fixed
+    once its predecessor is known; only the first token of the window is
+    counted as if it opened the text. `signature()` equals make_signature
+    of the window's tokens joined by spaces.
+    """
+
+    def __init__(self, size: int) -> None:
+        if size < 1:
+            raise ValueError("window size must be at least 1")
+        self.size = size
+        self.freq: Dict[str, int] = {}
+        self._chars = 0
+        self._total = 0
+        self._hapax = 0
+        # (cleaned, counts as first token, counts after predecessor, exit state)
+        self._window: deque = deque()
+        # sentence/word/phrase counts of every token after the first
+        self._sentences = self._words = self._phrases = 0
+        self._exit = _OPEN
+        # token -> (cleaned, {entry state: counts}, exit state)
+        self._tokens: Dict[str, Tuple[str, Dict[Tuple[bool, bool], Tuple[int, int, int]],
+                                      Tuple[bool, bool]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._window)
+
+    def push(self, token: str) -> None:
+        """Append one token, dropping the oldest once the window is full."""
+        entry = self._tokens.get(token)
+        if entry is None:
+            if len(self._tokens) > _TOKEN_MEMO_LIMIT:
+                self._tokens.clear()
+            shape = _token_shape(token)
+            # _EXIT_STATE covers every state a token can be entered in, _OPEN included
+            counts = {state: _shape_counts(shape, *state) for state in _EXIT_STATE.values()}
+            entry = self._tokens[token] = (clean_word(token), counts, _EXIT_STATE[shape[-1]])
+        cleaned, counts, exit_state = entry
+        linked = counts[self._exit]
+        self._exit = exit_state
+        window = self._window
+        if window:
+            self._sentences += linked[0]
+            self._words += linked[1]
+            self._phrases += linked[2]
+        window.append((cleaned, counts[_OPEN], linked, exit_state))
+        if cleaned:
+            freq = self.freq
+            n = freq.get(cleaned, 0)
+            freq[cleaned] = n + 1
+            if n == 0:
+                self._hapax += 1
+            elif n == 1:
+                self._hapax -= 1
+            self._chars += len(cleaned)
+            self._total += 1
+        if len(window) > self.size:
+            self._pop()
+
+    def extend(self, tokens: Iterable[str]) -> None:
+        for token in tokens:
+            self.push(token)
+
+    def _pop(self) -> None:
+        window = self._window
+        cleaned = window.popleft()[0]
+        if window:
+            # the new first token now counts as opening the text
+            linked = window[0][2]
+            self._sentences -= linked[0]
+            self._words -= linked[1]
+            self._phrases -= linked[2]
+        if cleaned:
+            freq = self.freq
+            n = freq[cleaned]
+            if n == 1:
+                del freq[cleaned]
+                self._hapax -= 1
+            else:
+                freq[cleaned] = n - 1
+                if n == 2:
+                    self._hapax += 1
+            self._chars -= len(cleaned)
+            self._total -= 1
+
+    def signature(self) -> List[float]:
+        """The 5-element signature of the tokens currently in the window."""
+        total = self._total
+        if total:
+            word_len = self._chars / total
+            ttr = len(self.freq) / total
+            hapax = self._hapax / total
+        else:
+            word_len = ttr = hapax = 0.0
+        if not self._window:
+            return [word_len, ttr, hapax, 0.0, 0.0]
+        first = self._window[0][1]
+        in_sentence, in_phrase = self._window[-1][3]
+        sentences = first[0] + self._sentences + in_sentence
+        words = first[1] + self._words
+        phrases = first[2] + self._phrases + in_phrase
+        if sentences:
+            return [word_len, ttr, hapax, words / sentences, phrases / sentences]
+        return [word_len, ttr, hapax, 0.0, 0.0]
+
+
+def windowed_signatures(
+    tokens: Iterable[str],
+    window: int,
+    step: Optional[int] = None
+) -> Iterator[Tuple[int, int, List[float]]]:
+    """
+    Yield (start, end, signature) for every `window`-token span
+    starting at 0, step, 2*step, ... (step defaults to `window`, i.e. no
+    overlap), plus a last window ending at the final token if the steps
+    did not land there, so the tail is always scored. Input shorter than
+    one window yields a single signature of all of it.
+    """
+    if step is None:
+        step = window
+    if step < 1:
+        raise ValueError("step must be at least 1")
+    win = SignatureWindow(window)
+    n = 0
+    last = 0
+    for token in tokens:
+        win.push(token)
+        n += 1
+        if n >= window and (n - window) % step == 0:
+            yield n - window, n, win.signature()
+            last = n
+    if last != n:
+        yield max(0, n - window), n, win.signature()
+
+
+def iter_file_tokens(path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """The whitespace tokens of the UTF-8 file at `path`, read in chunks."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            text = pending + decoder.decode(block)
+            tokens = text.split()
+            pending = tokens.pop() if tokens and not text[-1].isspace() else ''
+            yield from tokens
+    yield from (pending + decoder.decode(b'', final=True)).split()
+
+
+# ─── Signature Cache 
+
+CACHE_FILENAME = '.signatures.sqlite'
+# Bump whenever the signature definition changes; older caches are dropped.
+_CACHE_VERSION = 1
+
+
+def _new_hasher():
+    import hashlib  # only needed when (re)signing known files
+    return hashlib.blake2b(digest_size=16)
+
+
+def file_digest(path: str) -> str:
+    """Content hash of the file at `path`."""
+    h = _new_hasher()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class SignatureCache:
+    """
+    Persistent {filename: signature} store kept in an SQLite file.
+
+    A cached entry is reused while the file's size and mtime are unchanged,
+    so a warm lookup costs one stat. If only the mtime moved, the content
+    hash decides whether the file really has to be re-signed. Vectors of a
+    non-default FeatureSet live in their own table of the same file, and so
+    do the entries of `recursive` runs, so that neither a flat nor a
+    recursive run prunes the other's files.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        features: Optional[FeatureSet] = None,
+        recursive: bool = False
+    ) -> None:
+        self.path = path
+        import sqlite3  # not imported at startup: a loaded --index never needs it
+        self._db = sqlite3.connect(path)
+        try:
+            self._load(features, recursive)
+        except sqlite3.DatabaseError:
+            self._db.close()
+            raise
+        # set once SQLite refuses a write; lookups keep using `_rows`
+        self._read_only = False
+
+    def _load(self, features: Optional[FeatureSet], recursive: bool) -> None:
+        key = features.key if features is not None else ''
+        self._table = (f'signatures_{key}' if key else 'signatures') + ('_tree' if recursive else '')
+        if self._db.execute('PRAGMA user_version').fetchone()[0] != _CACHE_VERSION:
+            stale = self._db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'signatures%'"
+            ).fetchall()
+            for (table,) in stale:
+                self._db.execute(f'DROP TABLE "{table}"')
+            self._db.execute(f'PRAGMA user_version = {_CACHE_VERSION}')
+        self._db.execute(
+            f'CREATE TABLE IF NOT EXISTS {self._table} ('
+            'name TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, '
+            'digest TEXT, sig BLOB)'
+        )
+        self._rows = {
+            name: (size, mtime_ns, digest, sig)
+            for name, size, mtime_ns, digest, sig
+            in self._db.execute(f'SELECT name, size, mtime_ns, digest, sig FROM {self._table}')
+        }
+
+    def __enter__(self) -> 'SignatureCache':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def lookup(
+        self,
+        name: str,
+        path: str,
+        st: Optional[os.stat_result] = None
+    ) -> Tuple[os.stat_result, Optional[List[float]]]:
+        """
+        Stat `path` (unless its stat `st` is given) and return (stat, cached
+        signature), the signature being None if the entry is missing or
+        stale. Entries stored without a digest (archive members, keyed under
+        their archive's `path`) are only reused while size and mtime match.
+        """
+        if st is None:
+            st = os.stat(path)
+        row = self._rows.get(name)
+        if row is not None:
+            size, mtime_ns, digest, blob = row
+            if size == st.st_size:
+                if mtime_ns == st.st_mtime_ns:
+                    return st, _unpack_signature(blob)
+                if digest is not None and file_digest(path) == digest:
+                    self._store(name, st, digest, blob)
+                    return st, _unpack_signature(blob)
+        return st, None
+
+    def store(self, name: str, st: os.stat_result, digest: Optional[str], sig: List[float]) -> None:
+        """Record `sig` for the file `name` as it was when `st` was taken."""
+        self._store(name, st, digest, array('d', sig).tobytes())
+
+    def _store(self, name: str, st: os.stat_result, digest: Optional[str], blob: bytes) -> None:
+        self._rows[name] = (st.st_size, st.st_mtime_ns, digest, blob)
+        self._write(
+            f'INSERT OR REPLACE INTO {self._table} VALUES (?, ?, ?, ?, ?)',
+            [(name, st.st_size, st.st_mtime_ns, digest, blob)],
+        )
+
+    def prune(self, keep) -> None:
+        """Drop entries whose name is not in `keep`."""
+        gone = [name for name in self._rows if name not in keep]
+        for name in gone:
+            del self._rows[name]
+        if gone:
+            self._write(f'DELETE FROM {self._table} WHERE name = ?', [(n,) for n in gone])
+
+    def _write(self, sql: str, rows: List[tuple]) -> None:
+        """
+        Run `sql` for each of `rows`. If SQLite refuses (a read-only file or
+        directory, a damaged file), warn once and stop writing: the run goes
+        on uncached.
+        """
+        if self._read_only:
+            return
+        import sqlite3
+        try:
+            self._db.executemany(sql, rows)
+        except sqlite3.DatabaseError as e:
+            print(f"Not updating the signature cache {self.path}: {e}", file=sys.stderr)
+            self._read_only = True
+
+    def close(self) -> None:
+        import sqlite3
+        try:
+            self._db.commit()
+        except sqlite3.DatabaseError as e:
+            if not self._read_only:
+                print(f"Not updating the signature cache {self.path}: {e}", file=sys.stderr)
+        self._db.close()
+
+
+def open_cache(
+    path: str,
+    features: Optional[FeatureSet] = None,
+    recursive: bool = False
+) -> Optional[SignatureCache]:
+    """
+    SignatureCache(path, features, recursive), or None if SQLite cannot open the file
+    (e.g. the default cache in a read-only known_dir): a warning is printed
+    and the caller carries on without a cache. A damaged or non-SQLite file
+    is moved aside to `path`.corrupt and a new cache started in its place.
+    """
+    import sqlite3
     try:
-        author = process_data(args.mystery_file, args.known_dir, args.weights)
-        if author:
-            print(f"Likely author: {author}")
+        return SignatureCache(path, features, recursive)
+    except sqlite3.OperationalError as e:
+        error = e
+    except sqlite3.DatabaseError as e:
+        aside = path + '.corrupt'
+        try:
+            os.replace(path, aside)
+            cache = SignatureCache(path, features, recursive)
+        except (OSError, sqlite3.DatabaseError):
+            error = e
         else:
-            print("No known signatures found to compare against.")
-    except Exception as e:
-        print(f"Error: {e}")
-        exit(1)
+            print(f"Signature cache {path} was unreadable ({e}); moved it to {aside} "
+                  "and started a new one", file=sys.stderr)
+            return cache
+    print(f"Not using the signature cache {path}: {error}", file=sys.stderr)
+    return None
+
+
+def _unpack_signature(blob: bytes) -> List[float]:
+    sig = array('d')
+    sig.frombytes(blob)
+    return sig.tolist()
+
+
+# ─── Author-Attribution Core 
+
+def _sign_job(
+    path: str,
+    features: Optional[FeatureSet] = None,
+    digest: bool = False
+) -> Tuple[Optional[List[float]], Optional[str], Optional[str]]:
+    """
+    Sign one file for get_all_signatures: (signature, digest, error). The
+    content is only hashed with `digest`, i.e. when a cache will keep it.
+    """
+    try:
+        hasher = _new_hasher() if digest else None
+        sig = sign_file(path, hasher=hasher, features=features)
+        return sig, hasher and hasher.hexdigest(), None
+    except (OSError, UnicodeDecodeError) as e:
+        return None, None, str(e)
+
+
+def _sign_job_profiled(path: str, features: Optional[FeatureSet] = None, digest: bool = False):
+    """`_sign_job` in a pool worker, also returning the worker's profile of it."""
+    prof = enable_profiling()
+    try:
+        return _sign_job(path, features, digest), prof.report()
+    finally:
+        disable_profiling()
+
+
+def _run_sign_jobs(
+    paths: List[str],
+    jobs: int,
+    features: Optional[FeatureSet] = None,
+    digest: bool = False
+):
+    """
+    Sign `paths` in order, in-process or spread over `jobs` processes;
+    digests are only computed with `digest`.
+    """
+    sign_job, sign_job_profiled = _sign_job, _sign_job_profiled
+    if features is not None or digest:
+        sign_job = functools.partial(_sign_job, features=features, digest=digest)
+        sign_job_profiled = functools.partial(_sign_job_profiled, features=features, digest=digest)
+    if jobs <= 1 or len(paths) <= 1:
+        return map(sign_job, paths)
+    # Imported here so serial runs don't pay for the pool machinery.
+    from concurrent.futures import ProcessPoolExecutor
+    jobs = min(jobs, len(paths))
+    # A few chunks per worker keeps IPC overhead low and the load balanced.
+    chunksize = max(1, len(paths) // (jobs * 4))
+    prof = _profiler
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        if prof is None:
+            return list(pool.map(sign_job, paths, chunksize=chunksize))
+        with prof.stage('pool'):
+            results = []
+            for result, report in pool.map(sign_job_profiled, paths, chunksize=chunksize):
+                prof.merge(report)
+                results.append(result)
+        return results
+
+
+def shard_of(name: str, shards: int) -> int:
+    """Which of `shards` partitions the file `name` belongs to (stable across machines)."""
+    import zlib
+    return zlib.crc32(name.encode('utf-8')) % shards
+
+
+def list_known_files(known_dir: str) -> List[str]:
+    """
+    The .txt files of `known_dir` in os.listdir order: the order
+    get_all_signatures returns them in, which breaks ties between equal
+    scores.
+    """
+    return [f for f in os.listdir(known_dir) if f.lower().endswith('.txt')]
+
+
+def get_all_signatures(
+    known_dir: str,
+    cache: Optional[SignatureCache] = None,
+    jobs: int = 1,
+    features: Optional[FeatureSet] = None,
+    shard: Optional[Tuple[int, int]] = None
+) -> Dict[str, List[float]]:
+    """
+    Read every .txt file in `known_dir` and return {filename: signature}.
+
+    With a `cache`, unchanged files are not re-read and stale entries are
+    pruned. With `jobs` > 1 the files are signed by a process pool; the
+    result is the same dict in the same order. Files that cannot be read
+    or decoded are reported on stderr and left out. With `features` the
+    values are that FeatureSet's vectors (and `cache` must be opened for it).
+    With `shard` = (i, n) only the files `shard_of` puts in partition i
+    are read (give each shard its own cache).
+    """
+    with _stage('list'):
+        names = list_known_files(known_dir)
+        if shard is not None:
+            names = [f for f in names if shard_of(f, shard[1]) == shard[0]]
+    found: Dict[str, List[float]] = {}
+    todo = []
+    for fname in names:
+        path = os.path.join(known_dir, fname)
+        st = None
+        if cache is not None:
+            try:
+                with _stage('cache.lookup'):
+                    st, sig = cache.lookup(fname, path)
+            except OSError as e:
+                print(f"Skipping {fname}: {e}", file=sys.stderr)
+                continue
+            if sig is not None:
+                found[fname] = sig
+                continue
+        todo.append((fname, path, st))
+    if cache is not None and _profiler is not None:
+        _profiler.count('cache_hits', len(found))
+
+    results = _run_sign_jobs([path for _, path, _ in todo], jobs, features, cache is not None)
+    for (fname, path, st), (sig, digest, err) in zip(todo, results):
+        if err is not None:
+            print(f"Skipping {fname}: {err}", file=sys.stderr)
+            continue
+        if cache is not None:
+            with _stage('cache.store'):
+                cache.store(fname, st, digest, sig)
+        found[fname] = sig
+
+    if cache is not None:
+        with _stage('cache.store'):
+            cache.prune(found)
+    return {fname: found[fname] for fname in names if fname in found}
+
+
+def score_signature(sig1: List[float], sig2: List[float], weights: List[float]) -> float:
+    """Compute weighted sum of absolute differences between two signatures."""
+    return sum(w * abs(a - b) for a, b, w in zip(sig1, sig2, weights))
+
+
+# Upper bound on (queries x keys) distances held in memory at once.
+_BATCH_CELLS = 1 << 22
+
+
+class SignatureMatrix:
+    """
+    Known signatures held as one contiguous (n, d) float64 NumPy array with
+    the keys in a parallel list, so a query is scored against every row in
+    a few vectorised operations instead of a Python loop per key. A float32
+    matrix is kept as is and widened one column at a time while scoring.
+    """
+
+    def __init__(self, keys: List[str], matrix) -> None:
+        if load_numpy() is None:
+            raise ImportError("SignatureMatrix requires NumPy")
+        self.keys = keys if isinstance(keys, list) else list(keys)
+        matrix = np.ascontiguousarray(matrix)
+        if matrix.dtype not in (np.float32, np.float64):
+            matrix = matrix.astype(np.float64)
+        self.matrix = matrix
+        if self.matrix.ndim != 2 or len(self.matrix) != len(self.keys):
+            raise ValueError("matrix must have one row per key")
+
+    @classmethod
+    def from_dict(cls, sigs: Dict[str, List[float]]) -> 'SignatureMatrix':
+        if load_numpy() is None:
+            raise ImportError("SignatureMatrix requires NumPy")
+        keys = list(sigs)
+        width = len(next(iter(sigs.values()))) if sigs else 0
+        matrix = np.array([sigs[k] for k in keys], dtype=np.float64).reshape(len(keys), width)
+        return cls(keys, matrix)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def scores(self, sig: List[float], weights: List[float]):
+        """
+        Weighted L1 distance from `sig` to every row. Columns are summed left
+        to right like `score_signature`, so the floats are bit-identical.
+        """
+        scores = np.zeros(len(self.keys))
+        for j, (b, w) in enumerate(zip(sig, weights)):
+            if j >= self.matrix.shape[1]:
+                break
+            scores += w * np.abs(self._column(j) - b)
+        return scores
+
+    def _column(self, j: int):
+        """Column `j` as float64, as the Python loop would see its values."""
+        return self.matrix[:, j].astype(np.float64, copy=False)
+
+    def best(self, sig: List[float], weights: List[float]) -> Optional[str]:
+        """Key of the closest row; the first one wins ties, like the dict loop."""
+        if not self.keys:
+            return None
+        scores = self.scores(sig, weights)
+        scores[np.isnan(scores)] = np.inf
+        i = int(np.argmin(scores))
+        if not scores[i] < float('inf'):
+            return None
+        return self.keys[i]
+
+    def top_k(self, sig: List[float], weights: List[float], k: int) -> List[Tuple[str, float]]:
+        """The `k` closest (key, score) pairs, best first; ties keep key order."""
+        if not self.keys or k < 1:
+            return []
+        scores = self.scores(sig, weights)
+        return [(self.keys[i], float(scores[i])) for i in _smallest_indices(scores, k).tolist()]
+
+    @_timed('score')
+    def top_many(
+        self,
+        sigs: List[List[float]],
+        weights: List[float],
+        k: int = 1
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        `top_k` for each of `sigs`. Queries are scored as blocks of a
+        (queries, keys) distance matrix, sized to keep memory bounded.
+        """
+        n, d = self.matrix.shape
+        if not n or k < 1:
+            return [[] for _ in sigs]
+        if not sigs:
+            return []
+        queries = np.asarray(sigs, dtype=np.float64).reshape(len(sigs), -1)
+        width = min(d, queries.shape[1], len(weights))
+        step = max(1, _BATCH_CELLS // n)
+        out: List[List[Tuple[str, float]]] = []
+        for start in range(0, len(queries), step):
+            block = queries[start:start + step]
+            scores = np.zeros((len(block), n))
+            for j in range(width):
+                scores += weights[j] * np.abs(self._column(j) - block[:, j, None])
+            scores[np.isnan(scores)] = np.inf
+            if k == 1:
+                idx = scores.argmin(axis=1)
+                best = scores[np.arange(len(block)), idx]
+                for i, sc in zip(idx.tolist(), best.tolist()):
+                    out.append([(self.keys[i], sc)] if sc < float('inf') else [])
+                continue
+            for row in scores:
+                out.append([(self.keys[i], float(row[i])) for i in _smallest_indices(row, k).tolist()])
+        return out
+
+
+def _smallest_indices(scores, k: int):
+    """
+    Indices of the `k` smallest finite `scores` ordered by (score, index),
+    found with an O(n) partition rather than a full sort.
+    """
+    scores = np.where(np.isnan(scores), np.inf, scores)
+    if k < len(scores):
+        kth = np.partition(scores, k - 1)[k - 1]
+        # every index tied with the k-th score, so ties resolve by position
+        idx = np.flatnonzero(scores <= kth)
+    else:
+        idx = np.arange(len(scores))
+    idx = idx[scores[idx] < np.inf]
+    return idx[np.lexsort((idx, scores[idx]))][:k]
+
+
+# ─── Compact Signature Store 
+
+_STORE_MAGIC = b'SIGSTOR2'
+# magic, typecode, sketch flag, width, FeatureSet key, rows, key-table bytes;
+# 40 bytes keeps rows aligned
+_STORE_HEADER = struct.Struct('<8sc?2xI8sQQ')
+
+
+def _describe_features(key: str, sketch: bool) -> str:
+    return f"features {key or 'default'}" + (" with --sketch" if sketch else "")
+
+
+class SignatureStore(Mapping):
+    """
+    Signatures packed row after row into one contiguous float64 ('d') or
+    float32 ('f') array, with an interned key table and a key -> row dict.
+
+    Behaves as a read-only {key: signature} mapping, so it can be passed
+    anywhere a signature dict is accepted; `store[key] = sig` appends (or
+    overwrites) a row in O(1). `save()` writes a flat binary file whose
+    float block `load()` memory-maps without copying. The file records
+    which FeatureSet (and whether --sketch) produced the vectors.
+    """
+
+    def __init__(
+        self,
+        width: int = 5,
+        typecode: str = 'd',
+        features: Optional[FeatureSet] = None
+    ) -> None:
+        if typecode not in ('d', 'f'):
+            raise ValueError("typecode must be 'd' (float64) or 'f' (float32)")
+        self.width = width
+        self.typecode = typecode
+        self.features_key = features.key if features is not None else ''
+        self.sketch = features is not None and features.sketch
+        self._data = array(typecode)
+        self._keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._matrix: Optional[SignatureMatrix] = None
+        self._mmap: Optional[mmap.mmap] = None
+
+    @classmethod
+    def from_dict(
+        cls,
+        sigs: Dict[str, List[float]],
+        typecode: str = 'd',
+        features: Optional[FeatureSet] = None
+    ) -> 'SignatureStore':
+        width = len(next(iter(sigs.values()))) if sigs else 5
+        store = cls(width, typecode, features)
+        for key, sig in sigs.items():
+            store[key] = sig
+        return store
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._rows
+
+    def __getitem__(self, key: str) -> List[float]:
+        i = self._rows[key] * self.width
+        return self._data[i:i + self.width].tolist()
+
+    def __setitem__(self, key: str, sig: List[float]) -> None:
+        if len(sig) != self.width:
+            raise ValueError(f"expected a signature of {self.width} values")
+        if not isinstance(self._data, array):
+            self._data = self._copy_rows()  # copy-on-write off the mapped file
+        self._matrix = None
+        row = self._rows.get(key)
+        if row is not None:
+            self._data[row * self.width:(row + 1) * self.width] = array(self.typecode, sig)
+            return
+        try:
+            self._data.extend(sig)
+        except BufferError:
+            # a matrix view still pins the old buffer: move to a new one
+            self._data = self._copy_rows()
+            self._data.extend(sig)
+        key = sys.intern(key)
+        self._rows[key] = len(self._keys)
+        self._keys.append(key)
+
+    def _copy_rows(self) -> array:
+        rows = array(self.typecode)
+        rows.frombytes(memoryview(self._data).cast('B'))
+        return rows
+
+    def as_matrix(self) -> SignatureMatrix:
+        """A SignatureMatrix viewing the stored rows without copying (needs NumPy)."""
+        if self._matrix is None:
+            if load_numpy() is None:
+                raise ImportError("SignatureStore.as_matrix requires NumPy")
+            data = np.frombuffer(self._data, dtype=np.dtype(self.typecode))
+            # its own key list: later appends must not grow the keys under the view
+            keys = list(self._keys)
+            self._matrix = SignatureMatrix(keys, data.reshape(len(keys), self.width))
+        return self._matrix
+
+    def best(self, sig: List[float], weights: List[float]) -> Optional[str]:
+        """Same answer as find_best_match over the equivalent dict."""
+        if len(self) >= _VECTOR_MIN_CELLS and load_numpy() is not None:
+            return self.as_matrix().best(sig, weights)
+        return find_best_match(sig, self._as_dict(), weights)
+
+    def top_k(self, sig: List[float], weights: List[float], k: int) -> List[Tuple[str, float]]:
+        """Same answer as find_top_matches over the equivalent dict."""
+        if len(self) >= _VECTOR_MIN_CELLS and load_numpy() is not None:
+            return self.as_matrix().top_k(sig, weights, k)
+        return find_top_matches(sig, self._as_dict(), weights, k)
+
+    def _as_dict(self) -> Dict[str, List[float]]:
+        flat = self._data.tolist()
+        w = self.width
+        return dict(zip(self._keys, (flat[i:i + w] for i in range(0, len(flat), w))))
+
+    def save(self, path: str) -> None:
+        """Write header, little-endian float rows, then the key table."""
+        keys = [k.encode('utf-8') for k in self._keys]
+        offsets = array('Q', [0])
+        for k in keys:
+            offsets.append(offsets[-1] + len(k))
+        data = self._copy_rows()
+        if sys.byteorder == 'big':
+            data.byteswap()
+            offsets.byteswap()
+        blob = b''.join(keys)
+        with open(path, 'wb') as f:
+            f.write(_STORE_HEADER.pack(
+                _STORE_MAGIC, self.typecode.encode(), self.sketch, self.width,
+                self.features_key.encode(), len(keys), len(offsets) * offsets.itemsize + len(blob),
+            ))
+            f.write(data.tobytes())
+            f.write(offsets.tobytes())
+            f.write(blob)
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        use_mmap: bool = True,
+        features: Optional[FeatureSet] = None
+    ) -> 'SignatureStore':
+        """
+        Open a file written by `save()`. With `use_mmap` the rows stay in the
+        mapped file (zero-copy) until the store is first modified. With
+        `features`, raise ValueError unless the file was built with that
+        FeatureSet, sketching included.
+        """
+        with open(path, 'rb') as f:
+            if use_mmap and sys.byteorder == 'little':
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buf = f.read()
+        if buf[:len(_STORE_MAGIC)] == b'SIGSTOR1':
+            raise ValueError(f"{path} does not record its features; rebuild it with --reindex")
+        magic, typecode, sketch, width, key, rows, _ = _STORE_HEADER.unpack_from(buf, 0)
+        if magic != _STORE_MAGIC:
+            raise ValueError(f"{path} is not a signature store")
+        store = cls(width, typecode.decode())
+        store.features_key = key.rstrip(b'\0').decode()
+        store.sketch = sketch
+        built = (store.features_key, store.sketch)
+        if features is not None and built != (features.key, features.sketch):
+            raise ValueError(
+                f"{path} was built with {_describe_features(store.features_key, store.sketch)}, "
+                f"not {_describe_features(features.key, features.sketch)}; "
+                f"rebuild it with --reindex"
+            )
+        start = _STORE_HEADER.size
+        end = start + rows * width * store._data.itemsize
+        if isinstance(buf, mmap.mmap):
+            store._mmap = buf
+            store._data = memoryview(buf)[start:end].cast(store.typecode)
+        else:
+            store._data.frombytes(buf[start:end])
+            if sys.byteorder == 'big':
+                store._data.byteswap()
+        offsets = array('Q')
+        offsets.frombytes(buf[end:end + (rows + 1) * 8])
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        blob = bytes(buf[end + (rows + 1) * 8:])
+        text = blob.decode('utf-8')
+        if len(text) != len(blob):
+            text = blob  # not ASCII: byte offsets only index the raw blob
+        bounds = zip(offsets, offsets[1:])
+        if text is blob:
+            store._keys = [blob[a:b].decode('utf-8') for a, b in bounds]
+        else:
+            store._keys = [text[a:b] for a, b in bounds]
+        store._rows = dict(zip(store._keys, range(rows)))
+        return store
+
+
+# ─── Nearest-Neighbour Tree 
+
+class SignatureTree:
+    """
+    Exact nearest-neighbour index over a SignatureMatrix: a KD-tree whose
+    nodes keep the bounding box of their rows, searched best-first.
+
+    Weights only come in at query time. The weighted L1 distance from the
+    query to the nearest point of a node's box is a lower bound on the score
+    of every row inside it, for any non-negative weights, so a subtree is
+    skipped only when it cannot hold a better (or tied) row. Leaves are
+    scored column by column like SignatureMatrix.scores and ties resolve by
+    key order, so answers are identical to a linear scan.
+
+    `weights` only shapes the tree: nodes are split along the side that is
+    widest once the axes are rescaled by them. Build with the weights most
+    queries will use; other weights still get exact answers, just with less
+    pruning.
+    """
+
+    LEAF_SIZE = 64
+
+    def __init__(
+        self,
+        matrix: SignatureMatrix,
+        leaf_size: int = LEAF_SIZE,
+        weights: Optional[List[float]] = None
+    ) -> None:
+        self.source = matrix
+        self.keys = matrix.keys
+        data = matrix.matrix.astype(np.float64, copy=False)
+        # rows with NaN or inf can never score below inf, so never match
+        order = np.flatnonzero(np.isfinite(data).all(axis=1))
+        lo: List = []
+        hi: List = []
+        self._start: List[int] = []
+        self._end: List[int] = []
+        self._children: List[Tuple[int, ...]] = []
+        if len(order):
+            stack = [(self._add_node(data[order], 0, len(order), lo, hi), 0, len(order))]
+            scale = np.ones(data.shape[1])
+            if weights is not None:
+                scale[:len(weights)] = np.abs(weights[:data.shape[1]])
+            while stack:
+                node, start, end = stack.pop()
+                span = (hi[node] - lo[node]) * scale
+                dim = int(np.argmax(span))
+                if end - start <= leaf_size or span[dim] == 0:
+                    continue
+                mid = (start + end) // 2
+                seg = order[start:end]
+                order[start:end] = seg[np.argpartition(data[seg, dim], mid - start)]
+                left = self._add_node(data[order[start:mid]], start, mid, lo, hi)
+                right = self._add_node(data[order[mid:end]], mid, end, lo, hi)
+                self._children[node] = (left, right)
+                stack.append((left, start, mid))
+                stack.append((right, mid, end))
+        self._lo = np.array(lo).reshape(len(lo), data.shape[1])
+        self._hi = np.array(hi).reshape(len(hi), data.shape[1])
+        self._order = order
+        self._cols = [np.ascontiguousarray(data[order, j]) for j in range(data.shape[1])]
+
+    def _add_node(self, rows, start: int, end: int, lo: List, hi: List) -> int:
+        lo.append(rows.min(axis=0))
+        hi.append(rows.max(axis=0))
+        self._start.append(start)
+        self._end.append(end)
+        self._children.append(())
+        return len(lo) - 1
+
+    @classmethod
+    def from_dict(
+        cls,
+        sigs: Dict[str, List[float]],
+        leaf_size: int = LEAF_SIZE,
+        weights: Optional[List[float]] = None
+    ) -> 'SignatureTree':
+        return cls(SignatureMatrix.from_dict(sigs), leaf_size, weights)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def best(self, sig: List[float], weights: List[float]) -> Optional[str]:
+        """Same answer as SignatureMatrix.best."""
+        matches = self.top_k(sig, weights, 1)
+        return matches[0][0] if matches else None
+
+    def top_k(self, sig: List[float], weights: List[float], k: int) -> List[Tuple[str, float]]:
+        """Same answer as SignatureMatrix.top_k, visiting only the leaves that can matter."""
+        if not self.keys or k < 1:
+            return []
+        width = min(len(self._cols), len(sig), len(weights))
+        q = [float(x) for x in sig[:width]]
+        w = list(weights[:width])
+        if not all(x == x and abs(x) < float('inf') for x in q) or \
+                not all(0 <= x < float('inf') for x in w):
+            # the box bound needs finite queries and non-negative weights
+            return self.source.top_k(sig, weights, k)
+        if not self._children:
+            return []
+        found: List[Tuple[float, int]] = []  # max-heap of (-score, -row)
+        worst = float('inf')
+        todo = [(0.0, 0)]
+        while todo:
+            bound, node = heapq.heappop(todo)
+            if len(found) == k and bound > worst:
+                break
+            children = self._children[node]
+            if children:
+                for child in children:
+                    b = self._bound(child, q, w)
+                    if len(found) < k or b <= worst:
+                        heapq.heappush(todo, (b, child))
+                continue
+            start, end = self._start[node], self._end[node]
+            scores = np.zeros(end - start)
+            for j in range(width):
+                scores += w[j] * np.abs(self._cols[j][start:end] - q[j])
+            keep = scores < float('inf')
+            if len(found) == k:
+                keep &= scores <= worst
+            idx = np.flatnonzero(keep)
+            if len(idx) > k:
+                kth = np.partition(scores[idx], k - 1)[k - 1]
+                idx = idx[scores[idx] <= kth]
+            rows = self._order[start:end]
+            for i, sc in zip(idx.tolist(), scores[idx].tolist()):
+                item = (-sc, -int(rows[i]))
+                if len(found) < k:
+                    heapq.heappush(found, item)
+                elif item > found[0]:
+                    heapq.heapreplace(found, item)
+            if len(found) == k:
+                worst = -found[0][0]
+        return [(self.keys[-r], -sc) for sc, r in sorted(found, reverse=True)]
+
+    def _bound(self, node: int, q: List[float], w: List[float]) -> float:
+        """
+        Weighted L1 distance from `q` to the box of `node`, summed in the
+        same order as a row's score so it never exceeds one in float math.
+        """
+        bound = 0.0
+        for j, (lo, hi) in enumerate(zip(self._lo[node].tolist(), self._hi[node].tolist())):
+            if q[j] < lo:
+                bound += w[j] * (lo - q[j])
+            elif q[j] > hi:
+                bound += w[j] * (q[j] - hi)
+        return bound
+
+
+# ─── Pruned Search 
+
+# Signatures sampled to estimate each dimension's spread for `_dimension_order`.
+_SPREAD_SAMPLE = 64
+
+
+def _prune_limit(score: float, width: int) -> float:
+    """
+    The partial score, summed over `width` dimensions in any order, above
+    which a row's score_signature score is certainly above `score`: the
+    two summation orders differ by at most (width - 1) rounding errors.
+    """
+    return score + score * (4 * width * sys.float_info.epsilon)
+
+
+def _dimension_order(rows: Iterable[List[float]], weights: List[float], width: int) -> List[int]:
+    """
+    The first `width` dimensions with a non-zero weight, those expected to
+    add the most to a score first: by weight times the mean absolute
+    deviation of `rows` along the dimension.
+    """
+    rows = list(rows)
+    spread = []
+    for j in range(width):
+        col = [row[j] for row in rows]
+        mean = sum(col) / len(col) if col else 0.0
+        spread.append(sum(abs(v - mean) for v in col) / len(col) if col else 1.0)
+    return sorted(
+        (j for j in range(width) if weights[j]),
+        key=lambda j: (-(weights[j] * spread[j]), -weights[j]),
+    )
+
+
+class SortedSignatureIndex:
+    """
+    Exact pruned search over {key: signature} in pure Python, for many
+    queries against the same signatures when NumPy is not worth it.
+
+    Every dimension's values are kept sorted (each built on first use). A
+    query walks outward from its own value along the dimension with the
+    largest weight x spread; a row's term on that dimension alone is a
+    lower bound on its score, so the walk ends once both directions are
+    past the k-th best score and most rows are never looked at. Rows it
+    reaches are summed in weight x spread order and abandoned as soon as
+    the partial sum is out of reach; survivors get their score_signature
+    score and ties resolve by key order, so answers are identical to
+    find_top_matches over the dict. Negative or non-finite weights and
+    non-finite values fall back to that plain scan.
+    """
+
+    def __init__(self, sigs: Mapping) -> None:
+        self.keys = list(sigs)
+        self.rows = [list(sigs[key]) for key in self.keys]
+        self.width = min((len(row) for row in self.rows), default=0)
+        # pruning assumes every term is a finite, comparable number
+        self._prunable_rows = (
+            all(len(row) == self.width for row in self.rows)
+            and all(math.isfinite(v) for row in self.rows for v in row)
+        )
+        self.spread = []
+        for j in range(self.width):
+            col = [row[j] for row in self.rows]
+            mean = sum(col) / len(col)
+            self.spread.append(sum(abs(v - mean) for v in col) / len(col))
+        self._sorted: Dict[int, Tuple[List[float], List[int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _column(self, j: int) -> Tuple[List[float], List[int]]:
+        """Dimension `j`'s values in ascending order, with their row numbers."""
+        col = self._sorted.get(j)
+        if col is None:
+            rows = self.rows
+            ids = sorted(range(len(rows)), key=lambda i: rows[i][j])
+            col = self._sorted[j] = ([rows[i][j] for i in ids], ids)
+        return col
+
+    def _prunable(self, q: List[float], weights: List[float]) -> bool:
+        d = self.width
+        return (
+            self._prunable_rows and len(q) >= d and len(weights) >= d
+            and all(math.isfinite(v) for v in q[:d])
+            and all(math.isfinite(w) and w >= 0 for w in weights[:d])
+        )
+
+    def best(self, q: List[float], weights: List[float]) -> Optional[str]:
+        if not self._prunable(q, weights):
+            return find_best_match(q, dict(zip(self.keys, self.rows)), weights)
+        top = self.top_k(q, weights, 1)
+        return top[0][0] if top else None
+
+    def top_many(
+        self,
+        queries: List[List[float]],
+        weights: List[float],
+        k: int
+    ) -> List[List[Tuple[str, float]]]:
+        return [self.top_k(q, weights, k) for q in queries]
+
+    def top_k(self, q: List[float], weights: List[float], k: int) -> List[Tuple[str, float]]:
+        if k < 1 or not self.rows:
+            return []
+        if not self._prunable(q, weights):
+            return find_top_matches(q, dict(zip(self.keys, self.rows)), weights, k)
+        d = self.width
+        rows = self.rows
+        order = sorted(
+            (j for j in range(d) if weights[j]),
+            key=lambda j: (-(weights[j] * self.spread[j]), -weights[j]),
+        )
+        if not order:
+            # all weights zero: every score is 0 and key order decides
+            return [(self.keys[i], score_signature(rows[i], q, weights))
+                    for i in range(min(k, len(rows)))]
+        p = order[0]
+        wp, qp = weights[p], q[p]
+        values, ids = self._column(p)
+        hi = bisect.bisect_left(values, qp)
+        lo = hi - 1
+        n = len(values)
+        inf = float('inf')
+        found: List[Tuple[float, int]] = []  # max-heap of (-score, -row)
+        worst = limit = inf
+        while True:
+            # the row nearest the query on dimension p that is not seen yet
+            b_lo = wp * abs(values[lo] - qp) if lo >= 0 else inf
+            b_hi = wp * abs(values[hi] - qp) if hi < n else inf
+            if b_lo <= b_hi:
+                if lo < 0 or b_lo > worst:
+                    break
+                i = ids[lo]
+                lo -= 1
+            else:
+                if b_hi > worst:
+                    break
+                i = ids[hi]
+                hi += 1
+            row = rows[i]
+            partial = 0.0
+            for j in order:
+                partial += weights[j] * abs(row[j] - q[j])
+                if partial > limit:
+                    break
+            else:
+                sc = score_signature(row, q, weights)
+                if sc == inf:
+                    continue
+                item = (-sc, -i)
+                if len(found) < k:
+                    heapq.heappush(found, item)
+                elif item > found[0]:
+                    heapq.heapreplace(found, item)
+                else:
+                    continue
+                if len(found) == k:
+                    worst = -found[0][0]
+                    limit = _prune_limit(worst, d)
+        return [(self.keys[-r], -sc) for sc, r in sorted(found, reverse=True)]
+
+
+_INDEXES = (SignatureMatrix, SignatureStore, SignatureTree, SortedSignatureIndex)
+
+
+@_timed('score')
+def find_best_match(
+    mystery_sig: List[float],
+    known_sigs: Union[Dict[str, List[float]], SignatureMatrix, SignatureStore, SignatureTree,
+                      SortedSignatureIndex],
+    weights: List[float]
+) -> Optional[str]:
+    """
+    Return the filename whose signature is closest to `mystery_sig`.
+    `known_sigs` may be a SignatureMatrix or SignatureStore for a
+    vectorised search, or a SignatureTree or SortedSignatureIndex for a
+    sub-linear one.
+
+    A plain dict is scanned with early abandoning: dimensions are summed
+    heaviest first (weight x spread, estimated from a sample) and a
+    signature is dropped once its partial score is out of reach of the
+    best so far. Only the survivors are scored in full, so the answer is
+    the one the complete loop gives.
+    """
+    if isinstance(known_sigs, _INDEXES):
+        return known_sigs.best(mystery_sig, weights)
+    best_key: Optional[str] = None
+    best_score = float('inf')
+    width = min(len(mystery_sig), len(weights))
+    if any(w < 0 for w in weights[:width]):
+        # a negative term could bring a partial score back down: no pruning
+        for key, sig in known_sigs.items():
+            sc = score_signature(sig, mystery_sig, weights)
+            if sc < best_score:
+                best_score, best_key = sc, key
+        return best_key
+    sample = list(itertools.islice(known_sigs.values(), _SPREAD_SAMPLE))
+    width = min([width] + [len(sig) for sig in sample])
+    order = _dimension_order(sample, weights, width)
+    limit = best_score
+    for key, sig in known_sigs.items():
+        partial = 0.0
+        for j in order:
+            partial += weights[j] * abs(sig[j] - mystery_sig[j])
+            if partial > limit:
+                break
+        else:
+            sc = score_signature(sig, mystery_sig, weights)
+            if sc < best_score:
+                best_score, best_key = sc, key
+                limit = _prune_limit(sc, width)
+    return best_key
+
+
+@_timed('score')
+def find_top_matches(
+    mystery_sig: List[float],
+    known_sigs: Union[Dict[str, List[float]], SignatureMatrix, SignatureStore, SignatureTree,
+                      SortedSignatureIndex],
+    weights: List[float],
+    k: int
+) -> List[Tuple[str, float]]:
+    """
+    Return the `k` closest (filename, score) pairs, best first, scored with
+    `score_signature`. Ties are ordered like `find_best_match`, so the first
+    entry is always its answer. Selection is O(n log k) with a heap, or an
+    O(n) partition for a SignatureMatrix.
+    """
+    if isinstance(known_sigs, _INDEXES):
+        return known_sigs.top_k(mystery_sig, weights, k)
+    if k < 1:
+        return []
+    inf = float('inf')
+
+    def scored():
+        for i, (key, sig) in enumerate(known_sigs.items()):
+            sc = score_signature(sig, mystery_sig, weights)
+            # as in SignatureMatrix: NaN compares false both ways, which
+            # would scramble the heap, so it ranks (and is dropped) as inf
+            yield (sc if sc == sc else inf), i, key
+
+    return [
+        (key, sc) for sc, _, key in heapq.nsmallest(k, scored())
+        if sc < inf
+    ]
+
+
+# ─── Corpus Discovery 
+
+# Single compressed texts ('book.txt.gz') and the module that opens each.
+_COMPRESSED = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'lzma'}
+_TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+def corpus_kind(name: str) -> Optional[str]:
+    """'text', 'compressed', 'tar' or 'zip' for a corpus file name; None to skip it."""
+    lower = name.lower()
+    if lower.endswith('.txt'):
+        return 'text'
+    if lower.endswith(_TAR_SUFFIXES):
+        return 'tar'
+    if lower.endswith('.zip'):
+        return 'zip'
+    stem, ext = os.path.splitext(lower)
+    if ext in _COMPRESSED and stem.endswith('.txt'):
+        return 'compressed'
+    return None
+
+
+def _open_compressed(path: str) -> BinaryIO:
+    module = importlib.import_module(_COMPRESSED[os.path.splitext(path)[1].lower()])
+    return module.open(path, 'rb')
+
+
+def walk_corpus(root: str, recursive: bool = True) -> Iterator[Tuple[str, str, str]]:
+    """
+    Lazily yield (key, path, kind) for each corpus file under `root`, using
+    os.scandir one directory at a time, so the first files come out before
+    the rest of the tree has been listed. Keys are '/'-separated paths
+    relative to `root`; each directory's files come first, sorted by name,
+    then its subdirectories. Hidden and symlinked directories are skipped.
+    """
+    stack = ['']
+    while stack:
+        rel = stack.pop()
+        try:
+            with os.scandir(os.path.join(root, rel) if rel else root) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            print(f"Skipping {rel or root}: {e}", file=sys.stderr)
+            continue
+        subdirs = []
+        for entry in entries:
+            key = f"{rel}/{entry.name}" if rel else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and not entry.name.startswith('.'):
+                        subdirs.append(key)
+                    continue
+                kind = corpus_kind(entry.name)
+                if kind is not None and entry.is_file():
+                    yield key, entry.path, kind
+            except OSError as e:
+                print(f"Skipping {key}: {e}", file=sys.stderr)
+        stack.extend(reversed(subdirs))
+
+
+def iter_archive(path: str, kind: str) -> Iterator[Tuple[str, BinaryIO]]:
+    """
+    Yield (member name, binary file) for each .txt member of a tar (any
+    compression, read as a stream) or zip archive, without extracting to
+    disk. Each file is only readable until the next member is requested.
+    """
+    if kind == 'tar':
+        import tarfile
+        with tarfile.open(path, 'r|*') as tar:
+            for member in tar:
+                if member.isfile() and member.name.lower().endswith('.txt'):
+                    yield member.name, tar.extractfile(member)
+    else:
+        import zipfile
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and info.filename.lower().endswith('.txt'):
+                    with zf.open(info) as f:
+                        yield info.filename, f
+
+
+def _sign_source(
+    job: Tuple[str, Union[str, bytes]],
+    digest: bool = False,
+    features: Optional[FeatureSet] = None
+):
+    """
+    Pool-friendly signing of one corpus item: a ('text' | 'compressed', path),
+    ('stream', open binary file) or ('bytes', data) job. Returns (signature,
+    digest of the file on disk, error); streams and bytes have no digest.
+    """
+    kind, payload = job
+    try:
+        if kind == 'text':
+            hasher = _new_hasher() if digest else None
+            sig = sign_file(payload, hasher=hasher, features=features)
+            return sig, hasher and hasher.hexdigest(), None
+        if kind == 'compressed':
+            with _open_compressed(payload) as f:
+                sig = sign_stream(f, features=features)
+            return sig, file_digest(payload) if digest else None, None
+        if kind == 'stream':
+            return sign_stream(payload, features=features), None, None
+        return sign_stream(io.BytesIO(payload), features=features), None, None
+    except Exception as e:  # corrupt compressed data raises zlib.error, lzma.LZMAError, ...
+        return None, None, str(e)
+
+
+def sign_corpus(
+    root: str,
+    cache: Optional[SignatureCache] = None,
+    jobs: int = 1,
+    recursive: bool = True,
+    features: Optional[FeatureSet] = None
+) -> Iterator[Tuple[str, Optional[List[float]], Optional[str]]]:
+    """
+    Lazily yield (key, signature, error) for every text under `root`, in
+    walk order, starting as soon as the first file is found: .txt files,
+    .txt.gz/.bz2/.xz files and the .txt members of tar and zip archives
+    (keyed 'bundle.zip/member.txt'), which are streamed without being
+    extracted. Everything goes through `cache` if given, members against
+    their archive's size and mtime; once the whole corpus has been read,
+    cache entries not seen are pruned, so `cache` should be one opened
+    for recursive runs. With `jobs` > 1 texts are signed in
+    a process pool, with a bounded number in flight so the walk never runs
+    far ahead of the results; only members sent to the pool are read into
+    memory.
+    """
+    seen = set()
+
+    def items():
+        # (key, stat, cached signature, job, error)
+        for key, path, kind in walk_corpus(root, recursive):
+            if kind in ('tar', 'zip'):
+                yield from archive_items(key, path, kind)
+                continue
+            st = sig = None
+            if cache is not None:
+                try:
+                    st, sig = cache.lookup(key, path)
+                except OSError as e:
+                    yield key, None, None, None, str(e)
+                    continue
+            yield key, st, sig, None if sig is not None else (kind, path), None
+
+    def archive_items(key, path, kind):
+        st = None
+        try:
+            if cache is not None:
+                st = os.stat(path)
+            for name, f in iter_archive(path, kind):
+                member = f"{key}/{name}"
+                sig = cache.lookup(member, path, st)[1] if st is not None else None
+                # `f` is only readable until the next member is requested
+                yield member, st, sig, None if sig is not None else ('stream', f), None
+        except Exception as e:  # tarfile, zipfile, zlib and lzma all raise their own
+            yield key, None, None, None, str(e)
+
+    def finish(item, result):
+        key, st, sig, job, err = item
+        if job is not None:
+            sig, digest, err = result
+            if err is None and st is not None:
+                cache.store(key, st, digest, sig)
+        if sig is not None:
+            seen.add(key)
+        return key, sig, err
+
+    want_digest = cache is not None
+    if jobs <= 1:
+        for item in items():
+            job = item[3]
+            result = _sign_source(job, want_digest, features) if job is not None else None
+            yield finish(item, result)
+    else:
+        # Imported here so serial runs don't pay for the pool machinery.
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            pending: deque = deque()
+            for item in items():
+                job = item[3]
+                if job is not None and job[0] == 'stream':
+                    job = ('bytes', job[1].read())
+                future = pool.submit(_sign_source, job, want_digest, features) if job else None
+                pending.append((item, future))
+                while len(pending) > jobs * 4 or (pending and pending[0][1] is None):
+                    done, future = pending.popleft()
+                    yield finish(done, future.result() if future is not None else None)
+            while pending:
+                done, future = pending.popleft()
+                yield finish(done, future.result() if future is not None else None)
+    if cache is not None:
+        cache.prune(seen)
+
+
+def load_known_signatures(
+    known_dir: str,
+    cache_path: Optional[str] = None,
+    jobs: int = 1,
+    recursive: bool = False,
+    features: Optional[FeatureSet] = None
+) -> Dict[str, List[float]]:
+    """
+    get_all_signatures, through the SQLite cache at `cache_path` if given.
+    With `recursive`, the whole tree under `known_dir` is read instead,
+    compressed files and archives included (see `sign_corpus`).
+    """
+    cache = open_cache(cache_path, features, recursive) if cache_path is not None else None
+    with cache if cache is not None else nullcontext():
+        if not recursive:
+            return get_all_signatures(known_dir, cache, jobs, features)
+        sigs: Dict[str, List[float]] = {}
+        for key, sig, err in sign_corpus(known_dir, cache, jobs, features=features):
+            if err is not None:
+                print(f"Skipping {key}: {err}", file=sys.stderr)
+            else:
+                sigs[key] = sig
+        return sigs
+
+
+def process_data(
+    mystery_path: str,
+    known_dir: str,
+    weights: List[float],
+    cache_path: Optional[str] = None,
+    jobs: int = 1,
+    features: Optional[FeatureSet] = None
+) -> Optional[str]:
+    """
+    Read `mystery_path`, compute its signature, compare to known_dir,
+    and return the best-matching filename (or None if no files).
+    Known signatures are kept in the SQLite file `cache_path` if given
+    and signed with `jobs` processes. `features` selects the vector
+    (default: the original five values).
+    """
+    if not os.path.isfile(mystery_path):
+        raise FileNotFoundError(f"Mystery file not found: {mystery_path}")
+    known_sigs = load_known_signatures(known_dir, cache_path, jobs, features=features)
+    if not known_sigs:
+        return None
+    mystery_sig = sign_file(mystery_path, features=features)
+    return find_best_match(mystery_sig, known_sigs, weights)
+
+
+# ─── Incremental Corpus Index 
+
+class CorpusIndex:
+    """
+    Signatures of `known_dir` that are kept current in place.
+
+    `refresh()` stats every .txt file against the manifest of the last
+    refresh and signs only files that were added or modified, drops
+    deleted ones, and mirrors the changes into the SQLite cache at
+    `cache_path` if given. The first refresh is a full load. Afterwards
+    `signatures` equals what get_all_signatures would return.
+    """
+
+    def __init__(self, known_dir: str, cache_path: Optional[str] = None, jobs: int = 1) -> None:
+        self.known_dir = known_dir
+        self.cache_path = cache_path
+        self.jobs = jobs
+        self.signatures: Dict[str, List[float]] = {}
+        self._manifest: Dict[str, Tuple[int, int]] = {}
+
+    def refresh(self) -> Tuple[List[str], List[str], List[str]]:
+        """Bring the index up to date; returns (added, modified, removed) names."""
+        names = list_known_files(self.known_dir)
+        listed = set(names)
+        removed = [name for name in self._manifest if name not in listed]
+        added: List[str] = []
+        modified: List[str] = []
+        stale = []
+        for fname in names:
+            path = os.path.join(self.known_dir, fname)
+            try:
+                st = os.stat(path)
+            except OSError as e:
+                print(f"Skipping {fname}: {e}", file=sys.stderr)
+                continue
+            if self._manifest.get(fname) != (st.st_size, st.st_mtime_ns):
+                (modified if fname in self._manifest else added).append(fname)
+                stale.append((fname, path, st))
+        for fname in removed:
+            del self._manifest[fname]
+            self.signatures.pop(fname, None)
+        if not stale and not removed:
+            return added, modified, removed
+
+        cache = open_cache(self.cache_path) if self.cache_path is not None else None
+        if cache is None:
+            self._sign(stale, None)
+        else:
+            with cache:
+                self._sign(stale, cache)
+                cache.prune(self.signatures)
+        # keep get_all_signatures' listing order, which decides ties
+        if added or removed:
+            sigs = self.signatures
+            self.signatures = {name: sigs[name] for name in names if name in sigs}
+        return added, modified, removed
+
+    def _sign(self, stale, cache: Optional[SignatureCache]) -> None:
+        todo = []
+        for fname, path, st in stale:
+            if cache is not None:
+                try:
+                    st, sig = cache.lookup(fname, path)
+                except OSError as e:
+                    print(f"Skipping {fname}: {e}", file=sys.stderr)
+                    continue
+                if sig is not None:
+                    self._record(fname, st, sig)
+                    continue
+            todo.append((fname, path, st))
+        results = _run_sign_jobs([path for _, path, _ in todo], self.jobs, digest=cache is not None)
+        for (fname, path, st), (sig, digest, err) in zip(todo, results):
+            if err is not None:
+                print(f"Skipping {fname}: {err}", file=sys.stderr)
+                # remembered, so it is retried only once the file changes
+                self._manifest[fname] = (st.st_size, st.st_mtime_ns)
+                self.signatures.pop(fname, None)
+                continue
+            if cache is not None:
+                cache.store(fname, st, digest, sig)
+            self._record(fname, st, sig)
+
+    def _record(self, fname: str, st: os.stat_result, sig: List[float]) -> None:
+        self._manifest[fname] = (st.st_size, st.st_mtime_ns)
+        self.signatures[fname] = sig
+
+
+# ─── Author Profiles 
+
+class AuthorProfiles:
+    """
+    Per-author centroid (mean) and variance of book signatures, kept with
+    Welford's running update so a book can be added or removed in O(width)
+    without revisiting the author's other books. Searching the centroids
+    costs one row per author instead of one per book.
+    """
+
+    def __init__(self, width: int = 5) -> None:
+        self.width = width
+        self.counts: Dict[str, int] = {}
+        self._mean: Dict[str, List[float]] = {}
+        self._m2: Dict[str, List[float]] = {}
+
+    @classmethod
+    def from_books(
+        cls,
+        book_sigs: Dict[str, List[float]],
+        author_of: Dict[str, str]
+    ) -> 'AuthorProfiles':
+        """Profiles for `book_sigs`; books missing from `author_of` stand alone."""
+        width = len(next(iter(book_sigs.values()))) if book_sigs else 5
+        profiles = cls(width)
+        for book, sig in book_sigs.items():
+            profiles.add(author_of.get(book, book), sig)
+        return profiles
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def add(self, author: str, sig: List[float]) -> None:
+        """Fold one more book by `author` into its profile."""
+        n = self.counts.get(author, 0) + 1
+        self.counts[author] = n
+        if n == 1:
+            self._mean[author] = list(sig)
+            self._m2[author] = [0.0] * self.width
+            return
+        mean, m2 = self._mean[author], self._m2[author]
+        for j, x in enumerate(sig):
+            delta = x - mean[j]
+            mean[j] += delta / n
+            m2[j] += delta * (x - mean[j])
+
+    def remove(self, author: str, sig: List[float]) -> None:
+        """Take a book previously added for `author` back out of its profile."""
+        n = self.counts[author] - 1
+        if n == 0:
+            del self.counts[author], self._mean[author], self._m2[author]
+            return
+        self.counts[author] = n
+        mean, m2 = self._mean[author], self._m2[author]
+        for j, x in enumerate(sig):
+            delta = x - mean[j]
+            mean[j] -= delta / n
+            m2[j] = max(0.0, m2[j] - delta * (x - mean[j]))
+
+    def centroids(self) -> Dict[str, List[float]]:
+        """{author: mean signature}, usable wherever a signature dict is."""
+        return {author: list(mean) for author, mean in self._mean.items()}
+
+    def variances(self) -> Dict[str, List[float]]:
+        """{author: per-dimension population variance of its books}."""
+        return {
+            author: [v / self.counts[author] for v in m2]
+            for author, m2 in self._m2.items()
+        }
+
+    def top_k(
+        self,
+        sig: List[float],
+        weights: List[float],
+        k: int = 1,
+        use_variance: bool = False
+    ) -> List[Tuple[str, float]]:
+        """
+        The `k` closest authors. With `use_variance` each dimension's distance
+        is divided by that author's standard deviation, so authors with a
+        steady style on a feature are held to it more tightly. Authors with a
+        single book, or a zero spread, use the pooled within-author spread.
+        """
+        if not use_variance:
+            return find_top_matches(sig, self.centroids(), weights, k)
+        total = sum(self.counts.values())
+        pooled = [
+            (sum(m2[j] for m2 in self._m2.values()) / total) ** 0.5 if total else 0.0
+            for j in range(self.width)
+        ]
+        scored = []
+        for i, (author, mean) in enumerate(self._mean.items()):
+            n = self.counts[author]
+            score = 0.0
+            for j, (a, b, w) in enumerate(zip(mean, sig, weights)):
+                spread = (self._m2[author][j] / n) ** 0.5 if n > 1 else 0.0
+                spread = spread or pooled[j] or 1.0
+                score += w * abs(a - b) / spread
+            scored.append((score, i, author))
+        return [(author, sc) for sc, _, author in heapq.nsmallest(k, scored)]
+
+
+def read_author_manifest(path: str) -> Dict[str, str]:
+    """
+    {filename: author} from a JSON object or a two-column CSV file
+    (filename, author; a 'filename,author' header row is skipped).
+    """
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.json'):
+            return {str(k): str(v) for k, v in json.load(f).items()}
+        rows = [row for row in csv.reader(f) if row]
+    if rows and [c.strip().lower() for c in rows[0][:2]] == ['filename', 'author']:
+        rows = rows[1:]
+    return {row[0].strip(): row[1].strip() for row in rows if len(row) >= 2}
+
+
+def load_labelled_signatures(
+    known_dir: str,
+    manifest_path: Optional[str] = None,
+    use_cache: bool = True,
+    jobs: int = 1,
+    features: Optional[FeatureSet] = None
+) -> Tuple[Dict[str, List[float]], Dict[str, str]]:
+    """
+    ({book: signature}, {book: author}) for `known_dir`. With a manifest the
+    .txt files directly in `known_dir` are labelled by it (unlisted books
+    are their own author); otherwise every subdirectory of `known_dir` is
+    one author and holds that author's .txt books, keyed 'author/book.txt'
+    (each subdirectory then keeps its own signature cache).
+    """
+    if manifest_path is not None:
+        cache_path = os.path.join(known_dir, CACHE_FILENAME) if use_cache else None
+        sigs = load_known_signatures(known_dir, cache_path, jobs, features=features)
+        labels = read_author_manifest(manifest_path)
+        return sigs, {book: labels.get(book, book) for book in sigs}
+    sigs: Dict[str, List[float]] = {}
+    authors: Dict[str, str] = {}
+    for author in os.listdir(known_dir):
+        author_dir = os.path.join(known_dir, author)
+        if not os.path.isdir(author_dir):
+            continue
+        cache_path = os.path.join(author_dir, CACHE_FILENAME) if use_cache else None
+        author_sigs = load_known_signatures(author_dir, cache_path, jobs, features=features)
+        for fname, sig in author_sigs.items():
+            book = f"{author}/{fname}"
+            sigs[book] = sig
+            authors[book] = author
+    return sigs, authors
+
+
+def load_author_profiles(
+    known_dir: str,
+    manifest_path: Optional[str] = None,
+    use_cache: bool = True,
+    jobs: int = 1,
+    features: Optional[FeatureSet] = None
+) -> AuthorProfiles:
+    """Author profiles for `known_dir`, laid out as for `load_labelled_signatures`."""
+    sigs, authors = load_labelled_signatures(known_dir, manifest_path, use_cache, jobs, features)
+    return AuthorProfiles.from_books(sigs, authors)
+
+
+# ─── Batch Attribution 
+
+# Mysteries signed and scored together before results are emitted.
+BATCH_SIZE = 256
+
+
+def expand_mysteries(specs: Iterable[str]) -> Iterator[str]:
+    """
+    Turn mystery arguments into file paths: a directory yields its .txt
+    files, a pattern with wildcards yields its glob matches (both sorted),
+    anything else is taken as a file path.
+    """
+    for spec in specs:
+        if os.path.isdir(spec):
+            names = sorted(f for f in os.listdir(spec) if f.lower().endswith('.txt'))
+            for fname in names:
+                yield os.path.join(spec, fname)
+        elif glob.has_magic(spec):
+            yield from sorted(glob.glob(spec))
+        else:
+            yield spec
+
+
+def process_batch(
+    mystery_paths: Iterable[str],
+    known_dir: str,
+    weights: List[float],
+    cache_path: Optional[str] = None,
+    jobs: int = 1,
+    top: int = 1,
+    known_sigs: Optional[Dict[str, List[float]]] = None,
+    features: Optional[FeatureSet] = None
+) -> Iterator[Dict[str, object]]:
+    """
+    Attribute many mystery files against one signing of `known_dir`
+    (or against `known_sigs`, e.g. author centroids, if given).
+
+    Yields {'mystery', 'rank', 'match', 'score', 'error'} rows in input
+    order, up to `top` per mystery, one batch of BATCH_SIZE at a time so
+    results stream out while later mysteries are still being signed.
+    Mysteries are signed with `features`, which must match `known_sigs`.
+    """
+    if known_sigs is None:
+        known_sigs = load_known_signatures(known_dir, cache_path, jobs, features=features)
+    index = None
+    batch: List[str] = []
+    for path in mystery_paths:
+        batch.append(path)
+        if len(batch) >= BATCH_SIZE:
+            index = index or _search_index(known_sigs, len(batch))
+            yield from _score_batch(batch, known_sigs, index, weights, jobs, top, features)
+            batch = []
+    if batch:
+        index = index or _search_index(known_sigs, len(batch))
+        yield from _score_batch(batch, known_sigs, index, weights, jobs, top, features)
+
+
+def _search_index(known_sigs, queries: int):
+    """
+    The index worth building for `queries` lookups in `known_sigs`: a
+    SignatureMatrix once vectorising pays off, otherwise a
+    SortedSignatureIndex for more than one query, otherwise None.
+    """
+    if len(known_sigs) * queries >= _VECTOR_MIN_CELLS and load_numpy() is not None:
+        if isinstance(known_sigs, SignatureStore):
+            return known_sigs.as_matrix()
+        return SignatureMatrix.from_dict(known_sigs)
+    if queries > 1:
+        return SortedSignatureIndex(known_sigs)
+    return None
+
+
+def _score_batch(
+    paths: List[str],
+    known_sigs: Dict[str, List[float]],
+    index: Optional[Union[SignatureMatrix, SortedSignatureIndex]],
+    weights: List[float],
+    jobs: int,
+    top: int,
+    features: Optional[FeatureSet] = None
+) -> Iterator[Dict[str, object]]:
+    results = list(_run_sign_jobs(paths, jobs, features))
+    sigs = [sig for sig, _, err in results if err is None]
+    if index is not None:
+        ranked = index.top_many(sigs, weights, top)
+    else:
+        ranked = [find_top_matches(sig, known_sigs, weights, top) for sig in sigs]
+    ranked.reverse()
+    for path, (_, _, err) in zip(paths, results):
+        if err is not None:
+            yield {'mystery': path, 'rank': None, 'match': None, 'score': None, 'error': err}
+            continue
+        matches = ranked.pop()
+        if not matches:
+            yield {'mystery': path, 'rank': None, 'match': None, 'score': None, 'error': None}
+        for rank, (key, score) in enumerate(matches, 1):
+            yield {'mystery': path, 'rank': rank, 'match': key, 'score': score, 'error': None}
+
+
+def process_windows(
+    mystery_path: str,
+    known_sigs: Dict[str, List[float]],
+    weights: List[float],
+    window: int,
+    step: Optional[int] = None,
+    top: int = 1
+) -> Iterator[Dict[str, object]]:
+    """
+    `process_batch`-style rows for each window of `mystery_path`, with the
+    window's word range in the 'mystery' field ("book.txt[5000:10000]"), so
+    passages that match a different author stand out.
+    """
+    try:
+        for start, end, sig in windowed_signatures(iter_file_tokens(mystery_path), window, step):
+            label = f"{mystery_path}[{start}:{end}]"
+            matches = find_top_matches(sig, known_sigs, weights, top)
+            for rank, (key, score) in enumerate(matches, 1):
+                yield {'mystery': label, 'rank': rank, 'match': key, 'score': score, 'error': None}
+    except (OSError, UnicodeDecodeError) as e:
+        yield {'mystery': mystery_path, 'rank': None, 'match': None, 'score': None,
+               'error': str(e)}
+
+
+def write_results(rows: Iterable[Dict[str, object]], fmt: str, out=sys.stdout) -> None:
+    """Stream batch results to `out` as 'csv', 'jsonl' or plain 'text'."""
+    fields = ['mystery', 'rank', 'match', 'score', 'error']
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=fields)
+        writer.writeheader()
+    for row in rows:
+        if fmt == 'csv':
+            writer.writerow(row)
+        elif fmt == 'jsonl':
+            out.write(json.dumps(row) + '\n')
+        elif row['error'] is not None:
+            out.write(f"{row['mystery']}: error: {row['error']}\n")
+        elif row['rank'] is None or row['rank'] == 1:
+            out.write(f"{row['mystery']}: {row['match']}\n")
+        else:
+            out.write(f"{' ' * len(row['mystery'])}  {row['match']}\n")
+        out.flush()
+
+
+# ─── CLI Entrypoint 
+
+def main():
+    # --weights takes one value per dimension, so the feature set has to be
+    # known before it can be registered with a fixed nargs
+    feature_opts = argparse.ArgumentParser(add_help=False)
+    feature_opts.add_argument(
+        '--features',
+        metavar='NAMES',
+        default='default',
+        help="Comma-separated features making up the signature; 'default' is the "
+             f"original five (available: {', '.join(FEATURES)})"
+    )
+    feature_opts.add_argument(
+        '--sketch',
+        action='store_true',
+        help="Estimate vocabulary features from fixed-size sketches, so memory per text "
+             "stays flat however large its vocabulary"
+    )
+    pre, _ = feature_opts.parse_known_args()
+    try:
+        width = FeatureSet.parse(pre.features, pre.sketch).width
+    except ValueError:
+        width = len(DEFAULT_FEATURES)  # _run reports the bad --features
+
+    p = argparse.ArgumentParser(description="Attribution via text signatures", parents=[feature_opts])
+    p.add_argument('known_dir', help="Directory of known-author .txt files")
+    p.add_argument(
+        'mystery',
+        nargs='*',
+        help="Mystery .txt file(s), directories of them or glob patterns"
+    )
+    p.add_argument(
+        '--mystery-list',
+        metavar='FILE',
+        help="Also read mystery paths from FILE, one per line ('-' = stdin)"
+    )
+    p.add_argument(
+        '--format',
+        choices=['text', 'csv', 'jsonl'],
+        default='text',
+        help="Output format for batch results"
+    )
+    p.add_argument(
+        '--weights',
+        metavar='W',
+        nargs=width,
+        type=float,
+        default=[1.0] * width,
+        help="One weight per signature dimension (default: all 1)"
+    )
+    p.add_argument(
+        '--top',
+        metavar='K',
+        type=int,
+        default=1,
+        help="Report the K closest matches with their scores"
+    )
+    p.add_argument(
+        '--cache',
+        metavar='PATH',
+        help=f"Signature cache file (default: KNOWN_DIR/{CACHE_FILENAME})"
+    )
+    p.add_argument(
+        '--no-cache',
+        action='store_true',
+        help="Re-sign every known file instead of using the cache"
+    )
+    p.add_argument(
+        '--jobs',
+        metavar='N',
+        type=int,
+        default=1,
+        help="Processes used to sign the known files (0 = one per CPU)"
+    )
+    p.add_argument(
+        '--by-author',
+        action='store_true',
+        help="Each subdirectory of known_dir is one author; match author centroids"
+    )
+    p.add_argument(
+        '--author-manifest',
+        metavar='FILE',
+        help="CSV (filename,author) or JSON mapping the books in known_dir to authors"
+    )
+    p.add_argument(
+        '--window',
+        metavar='WORDS',
+        type=int,
+        help="Match every WORDS-word window of each mystery instead of the whole text"
+    )
+    p.add_argument(
+        '--step',
+        metavar='WORDS',
+        type=int,
+        help="Words between window starts (default: the window size)"
+    )
+    p.add_argument(
+        '--recursive',
+        action='store_true',
+        help="Read known_dir's whole tree, including .gz/.bz2/.xz texts and tar/zip bundles"
+    )
+    p.add_argument(
+        '--index',
+        metavar='PATH',
+        help="Signature store to match against; written from known_dir on first use"
+    )
+    p.add_argument(
+        '--reindex',
+        action='store_true',
+        help="Rebuild the --index store even if it exists"
+    )
+    p.add_argument(
+        '--profile',
+        metavar='FILE',
+        nargs='?',
+        const='-',
+        help="Write per-stage timings and counters as JSON to FILE (default: stderr)"
+    )
+    args = p.parse_intermixed_args()
+    if args.profile is None:
+        _run(p, args)
+        return
+    prof = enable_profiling()
+    try:
+        _run(p, args)
+    finally:
+        disable_profiling()
+        write_profile(prof.report(), args.profile)
+
+
+def _run(p: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    cache_path = None
+    if not args.no_cache:
+        cache_path = args.cache or os.path.join(args.known_dir, CACHE_FILENAME)
+    jobs = args.jobs or os.cpu_count() or 1
+    if not args.mystery and not args.mystery_list:
+        p.error("no mystery files given")
+    try:
+        feature_set = FeatureSet.parse(args.features, args.sketch)
+    except ValueError as e:
+        p.error(str(e))
+    # None keeps the original signing path (and cache table) for the default set
+    features = feature_set if feature_set.key else None
+    if args.window is not None and features is not None:
+        p.error("--window only supports the default features, without --sketch")
+    if (args.window is not None and args.window < 1) or (args.step is not None and args.step < 1):
+        p.error("--window and --step must be at least 1")
+
+    single = (
+        len(args.mystery) == 1 and not args.mystery_list and args.format == 'text'
+        and not os.path.isdir(args.mystery[0]) and not glob.has_magic(args.mystery[0])
+    )
+    known_sigs = None
+    try:
+        if args.index and not args.reindex and os.path.exists(args.index):
+            # no listing, stat or cache lookup per known file
+            known_sigs = SignatureStore.load(args.index, features=feature_set)
+        elif args.by_author or args.author_manifest:
+            known_sigs = load_author_profiles(
+                args.known_dir, args.author_manifest, not args.no_cache, jobs, features
+            ).centroids()
+        elif args.recursive:
+            known_sigs = load_known_signatures(
+                args.known_dir, cache_path, jobs, recursive=True, features=features
+            )
+        if args.index and not isinstance(known_sigs, SignatureStore):
+            if known_sigs is None:
+                known_sigs = load_known_signatures(
+                    args.known_dir, cache_path, jobs, features=features
+                )
+            known_sigs = SignatureStore.from_dict(known_sigs, features=feature_set)
+            known_sigs.save(args.index)
+        if isinstance(known_sigs, SignatureStore) and len(known_sigs) \
+                and known_sigs.width != feature_set.width:
+            raise ValueError(
+                f"{args.index} holds {known_sigs.width}-value signatures; "
+                f"rebuild it with --reindex for these features"
+            )
+    except Exception as e:
+        print(f"Error: {e}")
+        exit(1)
+
+    if args.window is not None:
+        try:
+            if known_sigs is None:
+                known_sigs = load_known_signatures(args.known_dir, cache_path, jobs)
+            mysteries = expand_mysteries(_mystery_specs(args.mystery, args.mystery_list))
+            write_results(
+                (row for mystery in mysteries for row in process_windows(
+                    mystery, known_sigs, args.weights, args.window, args.step, args.top)),
+                args.format,
+            )
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            exit(1)
+        return
+
+    if single and (args.top > 1 or known_sigs is not None):
+        try:
+            mystery = args.mystery[0]
+            if not os.path.isfile(mystery):
+                raise FileNotFoundError(f"Mystery file not found: {mystery}")
+            if known_sigs is None:
+                known_sigs = load_known_signatures(
+                    args.known_dir, cache_path, jobs, features=features
+                )
+            matches = find_top_matches(
+                sign_file(mystery, features=features), known_sigs, args.weights, args.top
+            )
+        except Exception as e:
+            print(f"Error: {e}")
+            exit(1)
+        if not matches:
+            print("No known signatures found to compare against.")
+        elif args.top == 1:
+            print(f"Likely author: {matches[0][0]}")
+        else:
+            for rank, (key, score) in enumerate(matches, 1):
+                print(f"{rank:>3}. {key}  ({score:.6f})")
+        return
+    if not single:
+        try:
+            mysteries = expand_mysteries(_mystery_specs(args.mystery, args.mystery_list))
+            rows = process_batch(
+                mysteries, args.known_dir, args.weights, cache_path, jobs, args.top,
+                known_sigs, features,
+            )
+            write_results(rows, args.format)
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            exit(1)
+        return
+
+    try:
+        author = process_data(
+            args.mystery[0], args.known_dir, args.weights, cache_path, jobs, features
+        )
+        if author:
+            print(f"Likely author: {author}")
+        else:
+            print("No known signatures found to compare against.")
+    except Exception as e:
+        print(f"Error: {e}")
+        exit(1)
+
+
+def write_profile(report: Dict[str, object], path: str) -> None:
+    """Write a Profiler report as JSON to `path`, or to stderr for '-'."""
+    if path == '-':
+        json.dump(report, sys.stderr, indent=2)
+        sys.stderr.write('\n')
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+
+def _mystery_specs(paths: List[str], list_file: Optional[str]) -> Iterator[str]:
+    yield from paths
+    if list_file is None:
+        return
+    f = sys.stdin if list_file == '-' else open(list_file, encoding='utf-8')
+    with f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
 
 
 if __name__ == '__main__':
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Sharded corpus index: every worker signs and holds one partition of the
+known corpus, and a coordinator scatters mystery signatures to all of
+them and gathers the matches.
+
+    python sharded_index.py worker KNOWN_DIR [--shard I/N] [--port P | --unix PATH]
+    python sharded_index.py query MYSTERY... --shards HOST:PORT,unix:PATH,... [--top K]
+    python sharded_index.py local KNOWN_DIR MYSTERY... [--shards N] [--check]
+
+A worker with --shard I/N reads only the files of KNOWN_DIR that
+`shard_of` assigns to partition I (so every node may see the same shared
+directory); without it, it reads the whole of KNOWN_DIR (for nodes that
+hold their own partition). `local` starts N workers as separate processes
+on Unix sockets, queries them and, with --check, compares the answers
+with an unsharded search.
+
+Workers speak newline-delimited JSON over TCP or Unix sockets. Each shard
+returns its own top K, each match with the key's position in the listing
+of KNOWN_DIR, and the coordinator merges them by score, then position:
+with --shard workers that is the tie-breaking of find_best_match over the
+whole directory, so results equal the unsharded CLI's. (Workers without
+--shard report position 0, and ties fall back to shard order.) Scores
+cross the wire as JSON numbers, which round-trip floats exactly, so merged
+scores equal those of a single-process search.
+"""
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import improved_authorship_identification as aid
+
+# Largest request or response line, in bytes.
+MAX_LINE = 64 << 20
+
+
+class ShardError(Exception):
+    """A shard could not be reached or answered with an error."""
+
+
+def parse_address(address: str) -> Tuple[str, object]:
+    """'unix:PATH' -> ('unix', PATH); 'HOST:PORT' -> ('tcp', (HOST, PORT))."""
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):]
+    host, sep, port = address.rpartition(':')
+    if not sep or not port.isdigit():
+        raise ValueError(f"bad shard address {address!r}; use HOST:PORT or unix:PATH")
+    return 'tcp', (host or '127.0.0.1', int(port))
+
+
+# ─── Worker
+
+class ShardWorker:
+    """
+    Holds one partition's signatures (searched as a SignatureMatrix when
+    NumPy is present) and answers 'info' and 'top' requests. `positions`
+    maps each key to its place in the listing of the whole corpus, which
+    the coordinator uses to break ties between shards.
+    """
+
+    def __init__(
+        self,
+        sigs: Dict[str, List[float]],
+        shard: Optional[Tuple[int, int]] = None,
+        features: Optional[aid.FeatureSet] = None,
+        positions: Optional[Dict[str, int]] = None
+    ) -> None:
+        self.shard = shard
+        self.positions = positions or {}
+        self.features_key = features.key if features is not None else ''
+        self.width = len(next(iter(sigs.values()))) if sigs else None
+        if aid.load_numpy() is not None and sigs:
+            self.known = aid.SignatureMatrix.from_dict(sigs)
+        else:
+            self.known = sigs
+
+    def answer(self, request: Dict[str, object]) -> Dict[str, object]:
+        op = request.get('op')
+        if op == 'info':
+            return {
+                'shard': list(self.shard) if self.shard else None,
+                'signatures': len(self.known),
+                'width': self.width,
+                'features': self.features_key,
+            }
+        if op == 'top':
+            weights = request['weights']
+            k = int(request.get('top', 1))
+            positions = self.positions
+            return {'matches': [
+                [[key, score, positions.get(key, 0)]
+                 for key, score in aid.find_top_matches(sig, self.known, weights, k)]
+                for sig in request['sigs']
+            ]}
+        raise ValueError(f"unknown op {op!r}")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer requests on one connection until the coordinator closes it."""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = await loop.run_in_executor(None, self.answer, json.loads(line))
+                except Exception as e:
+                    reply = {'error': str(e)}
+                writer.write(json.dumps(reply).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve_worker(worker: ShardWorker, address: str) -> None:
+    """Run `worker` on `address` until cancelled."""
+    kind, where = parse_address(address)
+    if kind == 'unix':
+        listener = await asyncio.start_unix_server(worker.handle, path=where, limit=MAX_LINE)
+    else:
+        listener = await asyncio.start_server(worker.handle, *where, limit=MAX_LINE)
+    shard = '/'.join(map(str, worker.shard)) if worker.shard else 'all'
+    print(f"Shard {shard}: {len(worker.known)} signatures on {address}", flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+
+# ─── Coordinator
+
+class ShardClient:
+    """One persistent connection to a shard worker."""
+
+    def __init__(self, address: str) -> None:
+        self.address = address
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def connect(self, timeout: float = 10.0) -> None:
+        """Connect, retrying until `timeout` seconds pass (the worker may still be signing)."""
+        kind, where = parse_address(self.address)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                if kind == 'unix':
+                    self._reader, self._writer = await asyncio.open_unix_connection(
+                        where, limit=MAX_LINE
+                    )
+                else:
+                    self._reader, self._writer = await asyncio.open_connection(
+                        *where, limit=MAX_LINE
+                    )
+                return
+            except OSError as e:
+                if time.monotonic() >= deadline:
+                    raise ShardError(f"{self.address}: {e}")
+                await asyncio.sleep(0.1)
+
+    async def request(self, message: Dict[str, object]) -> Dict[str, object]:
+        try:
+            self._writer.write(json.dumps(message).encode('utf-8') + b'\n')
+            await self._writer.drain()
+            line = await self._reader.readline()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError) as e:
+            raise ShardError(f"{self.address}: {e}")
+        if not line:
+            raise ShardError(f"{self.address}: connection closed")
+        reply = json.loads(line)
+        if 'error' in reply:
+            raise ShardError(f"{self.address}: {reply['error']}")
+        return reply
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+
+
+class Coordinator:
+    """
+    Scatter-gather over shard workers, in the order of `addresses`,
+    which fixes the tie-breaking between shards.
+    """
+
+    def __init__(self, addresses: Sequence[str]) -> None:
+        self.clients = [ShardClient(a) for a in addresses]
+
+    async def connect(self, timeout: float = 10.0) -> None:
+        await asyncio.gather(*(c.connect(timeout) for c in self.clients))
+
+    async def close(self) -> None:
+        await asyncio.gather(*(c.close() for c in self.clients))
+
+    async def info(self) -> List[Dict[str, object]]:
+        return await asyncio.gather(*(c.request({'op': 'info'}) for c in self.clients))
+
+    async def top_many(
+        self,
+        sigs: List[List[float]],
+        weights: List[float],
+        k: int
+    ) -> List[List[Tuple[str, float]]]:
+        """`find_top_matches` of each of `sigs` over the union of all shards."""
+        if k < 1:
+            return [[] for _ in sigs]
+        message = {'op': 'top', 'sigs': sigs, 'weights': weights, 'top': k}
+        replies = await asyncio.gather(*(c.request(message) for c in self.clients))
+        return [merge_matches([r['matches'][i] for r in replies], k) for i in range(len(sigs))]
+
+
+def merge_matches(per_shard: Sequence[Sequence[Sequence[object]]], k: int) -> List[Tuple[str, float]]:
+    """
+    Merge each shard's best-first [key, score, position] lists into the
+    overall top `k`, ordered by score and then listing position, as
+    find_top_matches orders the whole corpus. Each shard's list is already
+    in that order (its keys are listed in corpus order), and heapq.merge is
+    stable, so equal positions keep shard order.
+    """
+    merged = heapq.merge(*per_shard, key=lambda m: (m[1], m[2]))
+    return [(key, score) for key, score, _ in itertools.islice(merged, k)]
+
+
+def scatter_gather(
+    addresses: Sequence[str],
+    sigs: List[List[float]],
+    weights: List[float],
+    k: int = 1,
+    timeout: float = 10.0
+) -> List[List[Tuple[str, float]]]:
+    """One-shot `Coordinator.top_many`, checking that every shard signs alike."""
+    async def run():
+        coordinator = Coordinator(addresses)
+        await coordinator.connect(timeout)
+        try:
+            infos = await coordinator.info()
+            widths = {info['width'] for info in infos} - {None}
+            if len(widths) > 1 or len({info['features'] for info in infos}) > 1:
+                raise ShardError("shards were signed with different features")
+            if widths and widths != {len(weights)}:
+                raise ShardError(f"shards hold {widths.pop()}-value signatures, "
+                                 f"got {len(weights)} weights")
+            return await coordinator.top_many(sigs, weights, k)
+        finally:
+            await coordinator.close()
+    return asyncio.run(run())
+
+
+# ─── Local Cluster
+
+def start_local_workers(
+    known_dir: str,
+    shards: int,
+    socket_dir: str,
+    features: str = 'default',
+    jobs: int = 1,
+    use_cache: bool = True
+) -> Tuple[List[subprocess.Popen], List[str]]:
+    """
+    Launch `shards` worker processes over `known_dir`, one per partition,
+    listening on Unix sockets in `socket_dir`. Returns (processes, addresses).
+    """
+    script = os.path.abspath(__file__)
+    procs, addresses = [], []
+    for i in range(shards):
+        address = f"unix:{os.path.join(socket_dir, f'shard{i}.sock')}"
+        cmd = [sys.executable, script, 'worker', known_dir, '--shard', f"{i}/{shards}",
+               '--unix', address[len('unix:'):], '--features', features, '--jobs', str(jobs)]
+        if not use_cache:
+            cmd.append('--no-cache')
+        procs.append(subprocess.Popen(cmd, stdout=subprocess.DEVNULL))
+        addresses.append(address)
+    return procs, addresses
+
+
+def stop_local_workers(procs: List[subprocess.Popen]) -> None:
+    for proc in procs:
+        proc.terminate()
+    for proc in procs:
+        proc.wait()
+
+
+# ─── CLI Entrypoint
+
+def _parse_shard(spec: str) -> Tuple[int, int]:
+    try:
+        i, n = (int(v) for v in spec.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError("use I/N, e.g. 0/4")
+    if not 0 <= i < n:
+        raise argparse.ArgumentTypeError("need 0 <= I < N")
+    return i, n
+
+
+def _add_features_arg(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        '--features',
+        metavar='NAMES',
+        default='default',
+        help="Comma-separated signature features (must match on every shard)"
+    )
+
+
+def _add_query_args(p: argparse.ArgumentParser) -> None:
+    _add_features_arg(p)
+    p.add_argument('mystery', nargs='+', help="Mystery .txt file(s)")
+    p.add_argument('--weights', nargs='+', type=float, help="One weight per dimension (default: all 1)")
+    p.add_argument('--top', metavar='K', type=int, default=1, help="Matches reported per mystery")
+    p.add_argument('--timeout', type=float, default=60.0, help="Seconds to wait for every shard")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Sharded signature index with scatter-gather queries")
+    sub = p.add_subparsers(dest='command', required=True)
+
+    wk = sub.add_parser('worker', help="Sign one partition and serve it")
+    wk.add_argument('known_dir', help="Directory of known-author .txt files")
+    wk.add_argument('--shard', metavar='I/N', type=_parse_shard,
+                    help="Serve only partition I of N (default: all of known_dir)")
+    wk.add_argument('--host', default='127.0.0.1', help="Address to listen on")
+    wk.add_argument('--port', type=int, default=8766, help="TCP port to listen on")
+    wk.add_argument('--unix', metavar='PATH', help="Listen on a Unix socket instead of TCP")
+    _add_features_arg(wk)
+    wk.add_argument('--no-cache', action='store_true', help="Do not use the signature cache")
+    wk.add_argument('--jobs', metavar='N', type=int, default=1,
+                    help="Processes used to sign the partition (0 = one per CPU)")
+
+    qu = sub.add_parser('query', help="Match mysteries against running workers")
+    qu.add_argument('--shards', required=True, metavar='ADDRS',
+                    help="Comma-separated worker addresses (HOST:PORT or unix:PATH), in shard order")
+    _add_query_args(qu)
+
+    lo = sub.add_parser('local', help="Run N local workers, query them, shut them down")
+    lo.add_argument('known_dir', help="Directory of known-author .txt files")
+    lo.add_argument('--shards', metavar='N', type=int, default=4, help="Worker processes to start")
+    lo.add_argument('--jobs', metavar='N', type=int, default=1, help="Signing processes per worker")
+    lo.add_argument('--no-cache', action='store_true', help="Do not use the signature caches")
+    lo.add_argument('--check', action='store_true',
+                    help="Also search the whole corpus in-process and compare")
+    _add_query_args(lo)
+    args = p.parse_args()
+
+    try:
+        features = aid.FeatureSet.parse(args.features)
+    except ValueError as e:
+        p.error(str(e))
+    feature_set = features if features.key else None
+
+    if args.command == 'worker':
+        jobs = args.jobs or os.cpu_count() or 1
+        cache_path = None
+        if not args.no_cache:
+            name = aid.CACHE_FILENAME
+            if args.shard is not None:
+                # each partition prunes its own cache, so they must not share one
+                root, ext = os.path.splitext(name)
+                name = f"{root}.{args.shard[0]}of{args.shard[1]}{ext}"
+            cache_path = os.path.join(args.known_dir, name)
+        try:
+            listing = aid.list_known_files(args.known_dir) if args.shard is not None else None
+            cache = aid.open_cache(cache_path, feature_set) if cache_path is not None else None
+            if cache is None:
+                sigs = aid.get_all_signatures(args.known_dir, None, jobs, feature_set, args.shard)
+            else:
+                with cache:
+                    sigs = aid.get_all_signatures(args.known_dir, cache, jobs, feature_set, args.shard)
+        except Exception as e:
+            print(f"Error: {e}")
+            exit(1)
+        positions = None
+        if listing is not None:
+            # every partition lists the same directory, so positions agree
+            order = {name: i for i, name in enumerate(listing)}
+            positions = {key: order.get(key, len(order)) for key in sigs}
+        address = f"unix:{args.unix}" if args.unix else f"{args.host}:{args.port}"
+        try:
+            asyncio.run(serve_worker(ShardWorker(sigs, args.shard, feature_set, positions), address))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    weights = args.weights or [1.0] * features.width
+    if len(weights) != features.width:
+        p.error(f"--weights needs {features.width} values for these features")
+    try:
+        sigs = [aid.sign_file(m, features=feature_set) for m in args.mystery]
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"Error: {e}")
+        exit(1)
+
+    procs: List[subprocess.Popen] = []
+    with tempfile.TemporaryDirectory() as socket_dir:
+        try:
+            if args.command == 'local':
+                procs, addresses = start_local_workers(
+                    args.known_dir, args.shards, socket_dir, args.features, args.jobs,
+                    not args.no_cache,
+                )
+            else:
+                addresses = [a.strip() for a in args.shards.split(',') if a.strip()]
+            results = scatter_gather(addresses, sigs, weights, args.top, args.timeout)
+        except (ShardError, ValueError) as e:
+            print(f"Error: {e}")
+            exit(1)
+        finally:
+            stop_local_workers(procs)
+
+    for mystery, matches in zip(args.mystery, results):
+        if not matches:
+            print(f"{mystery}: no known signatures found")
+        elif args.top == 1:
+            print(f"{mystery}: {matches[0][0]}")
+        else:
+            print(f"{mystery}:")
+            for rank, (key, score) in enumerate(matches, 1):
+                print(f"{rank:>3}. {key}  ({score:.6f})")
+
+    if args.command == 'local' and args.check:
+        # the whole directory in one process, as the unsharded CLI reads it
+        known = aid.get_all_signatures(args.known_dir, jobs=args.jobs, features=feature_set)
+        expected = [aid.find_top_matches(sig, known, weights, args.top) for sig in sigs]
+        if expected != results:
+            print("CHECK FAILED: sharded results differ from the in-process search")
+            exit(1)
+        print(f"Check passed: {len(sigs)} mysteries match the in-process search")
+
+
+if __name__ == '__main__':
+    main()